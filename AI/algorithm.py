@@ -1,19 +1,8 @@
-import datetime
-from ml_predictor import MLModel  # For type hinting if needed
-
-def get_adjacent_ids(inter_id, rows, cols):
-    row = (inter_id - 1) // cols
-    col = (inter_id - 1) % cols
-    adjacent = []
-    if row > 0:
-        adjacent.append((row - 1) * cols + col + 1)
-    if row < rows - 1:
-        adjacent.append((row + 1) * cols + col + 1)
-    if col > 0:
-        adjacent.append(row * cols + (col - 1) + 1)
-    if col < cols - 1:
-        adjacent.append(row * cols + (col + 1) + 1)
-    return adjacent
+import numpy as np
+from traffic_state import (TrafficState, ROADS, CAR, AMBULANCE, SCHOOLBUS, PHASE_A, PHASE_B,
+                           PHASE_EMERGENCY, PHASE_NAMES, PHASE_ROADS, CONGESTION_LEVELS)
+from road_network import RoadNetwork
+from signal_controller import SIGNAL_NAMES
 
 def compute_phase_green_times(roads_counts, total_cycle=120):
     north_count = roads_counts.get("north", {}).get("car", 0)
@@ -40,126 +29,157 @@ def fuzzy_green_time(car_count):
     else:
         return 90
 
-def optimize_intersections(traffic_data, prediction_data, config, current_time, rl_agent=None, ml_model=None):
+def fuzzy_green_times(car_counts):
+    """Vectorized fuzzy_green_time over an array of counts."""
+    return np.where(car_counts < 10, 30, np.where(car_counts < 20, 60, 90))
+
+_network_cache = {}
+
+def network_from_config(config):
+    """Road network for callers that do not build one at startup, cached per topology."""
+    key = (repr(config.get("adjacency")), repr(config.get("grid")), config.get("adjacent_weight"), config.get("adjacency_directed"))
+    if key not in _network_cache:
+        _network_cache[key] = RoadNetwork.from_config(config)
+    return _network_cache[key]
+
+def optimize_state(state, config, current_time, rl_agent=None, ml_model=None, network=None):
+    """
+    Vectorized engine behind optimize_intersections. Works on a TrafficState and returns a
+    dict of per-intersection arrays: phase, emergency_phase, forced, dynamic_duration,
+    lane_green_times, congestion, green (per approach) and rl_override.
+    """
     operation_mode = config.get("operation_mode", "normal")
     use_fuzzy_logic = config.get("use_fuzzy_logic", False)
-    results = {}
-
-    # Process each intersection.
-    for inter_no, roads in traffic_data.items():
-        # Emergency mode: if any road detects an ambulance.
-        emergency_detected = False
-        emergency_road = None
-        for road, counts in roads.items():
-            if counts.get("ambulance", 0) > 0:
-                emergency_detected = True
-                emergency_road = road
-                break
-        if emergency_detected:
-            emergency_phase = "A" if emergency_road in ["north", "south"] else "B"
-            results[inter_no] = {
-                "phase": "EMERGENCY",
-                "roads": roads,
-                "dynamic_duration": 15,
-                "emergency_phase": emergency_phase
-            }
-            continue
-
-        # Compute reactive counts.
-        count_A = sum(roads.get(r, {}).get("car", 0) for r in ["north", "south"])
-        count_B = sum(roads.get(r, {}).get("car", 0) for r in ["east", "west"])
-        pred_A = sum(prediction_data[inter_no].get(r, {}).get("car", 0) for r in ["north", "south"])
-        pred_B = sum(prediction_data[inter_no].get(r, {}).get("car", 0) for r in ["east", "west"])
-        effective_A = 0.5 * count_A + 0.5 * pred_A
-        effective_B = 0.5 * count_B + 0.5 * pred_B
-
-        # In normal mode, include adjacent intersections' data.
-        if operation_mode == "normal" and "grid" in config:
-            rows = config["grid"]["rows"]
-            cols = config["grid"]["cols"]
-            current_id = int(inter_no)
-            adj_ids = get_adjacent_ids(current_id, rows, cols)
-            adjacent_weight = 0.5
-            for adj in adj_ids:
-                adj_str = str(adj)
-                if adj_str in traffic_data:
-                    adj_count_A = sum(traffic_data[adj_str].get(r, {}).get("car", 0) for r in ["north", "south"])
-                    adj_count_B = sum(traffic_data[adj_str].get(r, {}).get("car", 0) for r in ["east", "west"])
-                    effective_A += adjacent_weight * adj_count_A
-                    effective_B += adjacent_weight * adj_count_B
-
-        # Force phase switch if one phase is empty (cars + schoolbuses).
-        phase_A_total = sum(roads.get(r, {}).get("car", 0) + roads.get(r, {}).get("schoolbus", 0)
-                            for r in ["north", "south"])
-        phase_B_total = sum(roads.get(r, {}).get("car", 0) + roads.get(r, {}).get("schoolbus", 0)
-                            for r in ["east", "west"])
-        if phase_A_total == 0 and phase_B_total > 0:
-            chosen_phase = "B"
-            print(f"Intersection {inter_no}: No vehicles in north-south; switching to Phase B.")
-        elif phase_B_total == 0 and phase_A_total > 0:
-            chosen_phase = "A"
-            print(f"Intersection {inter_no}: No vehicles in east-west; switching to Phase A.")
-        else:
-            if use_fuzzy_logic and operation_mode == "normal":
-                fuzzy_time_A = fuzzy_green_time(effective_A)
-                fuzzy_time_B = fuzzy_green_time(effective_B)
-                chosen_phase = "A" if fuzzy_time_A >= fuzzy_time_B else "B"
-            else:
-                chosen_phase = "A" if effective_A >= effective_B else "B"
-
-        # Compute reactive duration.
-        base_duration = config.get("base_duration", 10)
-        extension_factor = config.get("extension_factor", 0.5)
-        max_extension = config.get("max_extension", 20)
-        effective_count = effective_A if chosen_phase == "A" else effective_B
-        reactive_duration = base_duration + min(effective_count * extension_factor, max_extension)
-
-        # School release adjustment for intersection "3" on road "west".
-        if inter_no == "3":
-            if "15:25" <= current_time.strftime("%H:%M") <= "15:35":
-                reactive_duration *= 1.5
-
-        if operation_mode == "ml" and ml_model is not None:
-            effective_count = effective_A if chosen_phase == "A" else effective_B
-            dynamic_duration = ml_model.predict_optimal_green(effective_count, current_time)
+    n = len(state)
+    counts = state.counts
+    cars = counts[:, :, CAR]
+
+    # Emergency mode: the first approach with an ambulance decides the phase.
+    ambulance = counts[:, :, AMBULANCE] > 0
+    emergency = ambulance.any(axis=1)
+    emergency_phase = np.where(ambulance.argmax(axis=1) < 2, PHASE_A, PHASE_B)
+
+    # Compute reactive counts.
+    count_A = cars[:, 0] + cars[:, 1]
+    count_B = cars[:, 2] + cars[:, 3]
+    effective_A = 0.5 * count_A + 0.5 * (state.predicted[:, 0] + state.predicted[:, 1])
+    effective_B = 0.5 * count_B + 0.5 * (state.predicted[:, 2] + state.predicted[:, 3])
+
+    # In normal mode, include adjacent intersections' data through the road-network graph.
+    if operation_mode == "normal" and n:
+        if network is None:
+            network = network_from_config(config)
+        if network is not None:
+            effective_A = effective_A + network.influence(count_A, state.ids)
+            effective_B = effective_B + network.influence(count_B, state.ids)
+
+    # Force phase switch if one phase is empty (cars + schoolbuses).
+    vehicles = cars + counts[:, :, SCHOOLBUS]
+    phase_A_total = vehicles[:, 0] + vehicles[:, 1]
+    phase_B_total = vehicles[:, 2] + vehicles[:, 3]
+    force_B = (phase_A_total == 0) & (phase_B_total > 0)
+    force_A = (phase_B_total == 0) & (phase_A_total > 0)
+    if use_fuzzy_logic and operation_mode == "normal":
+        prefer_A = fuzzy_green_times(effective_A) >= fuzzy_green_times(effective_B)
+    else:
+        prefer_A = effective_A >= effective_B
+    phase = np.where(force_B, PHASE_B, np.where(force_A | prefer_A, PHASE_A, PHASE_B))
+    forced = np.where(emergency, -1, np.where(force_B, PHASE_B, np.where(force_A, PHASE_A, -1)))
+
+    # Compute reactive duration.
+    base_duration = config.get("base_duration", 10)
+    extension_factor = config.get("extension_factor", 0.5)
+    max_extension = config.get("max_extension", 20)
+    effective_count = np.where(phase == PHASE_A, effective_A, effective_B)
+    dynamic_duration = base_duration + np.minimum(effective_count * extension_factor, max_extension)
+
+    # School release adjustment for intersection "3" on road "west".
+    if "3" in state.index and "15:25" <= current_time.strftime("%H:%M") <= "15:35":
+        dynamic_duration[state.index["3"]] *= 1.5
+
+    if operation_mode == "ml" and ml_model is not None:
+        regular = ~emergency
+        regular_ids = [state.ids[i] for i in np.flatnonzero(regular)]
+        dynamic_duration[regular] = ml_model.predict_batch(effective_count[regular], current_time, regular_ids)
+
+    phase = np.where(emergency, PHASE_EMERGENCY, phase)
+    dynamic_duration = np.where(emergency, 15.0, dynamic_duration)
+
+    # Lane green split and congestion level from raw car counts.
+    total_cars = cars.sum(axis=1)
+    total_cycle = 120
+    safe_total = np.where(total_cars == 0, 1, total_cars)
+    lane_green_times = np.stack([np.maximum(cars[:, 0], cars[:, 1]) / safe_total * total_cycle,
+                                 np.maximum(cars[:, 2], cars[:, 3]) / safe_total * total_cycle], axis=1)
+    lane_green_times[total_cars == 0] = total_cycle / 2
+    congestion = np.where(total_cars > 50, 2, np.where(total_cars > 20, 1, 0))
+
+    # One entire phase is green; emergencies serve the ambulance's phase.
+    served = np.where(emergency, emergency_phase, phase)
+    green = PHASE_ROADS[np.minimum(served, PHASE_B)]
+
+    # If RL mode is chosen, RL durations apply everywhere but only emergencies keep the RL signal,
+    # since every other intersection is held to its computed phase.
+    rl_override = operation_mode == "rl" and rl_agent is not None
+    if rl_override:
+        actions, rl_durations = rl_agent.optimal_actions(count_A, count_B, config)
+        dynamic_duration = rl_durations.astype(np.float64)
+        green = np.where(emergency[:, None], PHASE_ROADS[actions], green)
+
+    return {
+        "phase": phase,
+        "emergency_phase": emergency_phase,
+        "forced": forced,
+        "dynamic_duration": dynamic_duration,
+        "lane_green_times": lane_green_times,
+        "congestion": congestion,
+        "green": green,
+        "rl_override": rl_override,
+    }
+
+def optimize_intersections(traffic_data, prediction_data, config, current_time, rl_agent=None, ml_model=None,
+                           network=None, controller=None):
+    """
+    Dict-based adapter over optimize_state. Returns the per-road output signal list
+    and a {intersection: phase} map, as consumed by main.py and the API.
+    With a SignalController the plan is handed to it and the signals and phases it reports
+    (including yellow and all-red intervals) are the ones actually shown.
+    """
+    operation_mode = config.get("operation_mode", "normal")
+    state = TrafficState.from_dicts(traffic_data, prediction_data)
+    result = optimize_state(state, config, current_time, rl_agent, ml_model, network)
+    if controller is not None:
+        served_axis = np.where(result["green"][:, 0], PHASE_A, PHASE_B)
+        controller.plan(state.ids, result["phase"], served_axis, result["dynamic_duration"], current_time.timestamp())
+        signals = controller.signals(state.ids).tolist()
+    else:
+        signals = np.where(result["green"], 0, 2).tolist()
+
+    for i in np.flatnonzero(result["forced"] >= 0):
+        if result["forced"][i] == PHASE_B:
+            print(f"Intersection {state.ids[i]}: No vehicles in north-south; switching to Phase B.")
         else:
-            dynamic_duration = reactive_duration
+            print(f"Intersection {state.ids[i]}: No vehicles in east-west; switching to Phase A.")
 
-        results[inter_no] = {
-            "phase": chosen_phase,
-            "roads": roads,
-            "dynamic_duration": dynamic_duration
-        }
+    if result["rl_override"]:
+        mode = "DRL Optimized"
+    elif operation_mode == "ml":
+        mode = "ML Predictive"
+    else:
+        mode = "Normal"
 
     # Build final output signals.
     output = []
-    for inter_no, data in results.items():
-        phase = data["phase"]
-        roads = data["roads"]
-        dynamic_duration = data["dynamic_duration"]
-        lane_green_times = compute_phase_green_times(roads, total_cycle=120)
-        total_cars = sum(roads.get(r, {}).get("car", 0) for r in ["north", "south", "east", "west"])
-        if total_cars > 50:
-            congestion_level = "high"
-        elif total_cars > 20:
-            congestion_level = "medium"
-        else:
-            congestion_level = "low"
+    phases = result["phase"].tolist()
+    durations = result["dynamic_duration"].tolist()
+    lane_green_times = result["lane_green_times"].tolist()
+    congestion = result["congestion"].tolist()
+    for i, (inter_no, roads) in enumerate(traffic_data.items()):
         for road_no, counts in roads.items():
-            if phase == "EMERGENCY":
-                emergency_phase = data.get("emergency_phase")
-                if emergency_phase == "A":
-                    signal = "GREEN" if road_no in ["north", "south"] else "RED"
-                else:
-                    signal = "GREEN" if road_no in ["east", "west"] else "RED"
+            if road_no in ROADS:
+                signal = SIGNAL_NAMES[signals[i][ROADS.index(road_no)]]
             else:
-                if phase == "A" and road_no in ["north", "south"]:
-                    signal = "GREEN"
-                elif phase == "B" and road_no in ["east", "west"]:
-                    signal = "GREEN"
-                else:
-                    signal = "RED"
-            # Note: Accident detection is reported but does not change the signal.
+                signal = "RED"
             out_item = {
                 "intersection": inter_no,
                 "road": road_no,
@@ -169,45 +189,16 @@ def optimize_intersections(traffic_data, prediction_data, config, current_time,
                 "accidents": counts.get("accident", 0),
                 "predicted_cars": round(prediction_data[inter_no][road_no]["car"], 1),
                 "signal": signal,
-                "dynamic_green_duration": round(dynamic_duration, 1),
-                "lane_green_times": lane_green_times,
-                "congestion_level": congestion_level
+                "dynamic_green_duration": round(durations[i], 1),
+                "lane_green_times": lane_green_times[i],
+                "congestion_level": CONGESTION_LEVELS[congestion[i]],
+                "mode": mode
             }
             output.append(out_item)
+            # Note: Accident detection is reported but does not change the signal.
             if counts.get("accident", 0) > 0:
                 print(f"ALERT: Accident detected at Intersection {inter_no}, Road {road_no}")
 
-    # If RL mode is chosen, override outputs with RL agent recommendations.
-    if operation_mode == "rl" and rl_agent is not None:
-        rl_signals = rl_agent.get_optimal_signals(traffic_data, config)
-        for inter_id, roads in rl_signals.items():
-            for road, rl_data in roads.items():
-                for out in output:
-                    if out["intersection"] == inter_id and out["road"] == road:
-                        out["signal"] = rl_data["signal"]
-                        out["dynamic_green_duration"] = rl_data["dynamic_duration"]
-                        out["mode"] = "DRL Optimized"
-
-    # Enforce that one entire phase is active.
-    for inter_no, data in results.items():
-        if data.get("phase") == "EMERGENCY":
-            continue
-        computed_phase = data["phase"]
-        for out_item in output:
-            if out_item["intersection"] == inter_no:
-                if computed_phase == "A":
-                    out_item["signal"] = "GREEN" if out_item["road"] in ["north", "south"] else "RED"
-                elif computed_phase == "B":
-                    out_item["signal"] = "GREEN" if out_item["road"] in ["east", "west"] else "RED"
-
-    # Set a mode field for non-RL outputs.
-    for item in output:
-        if "mode" not in item:
-            if operation_mode == "ml":
-                item["mode"] = "ML Predictive"
-            elif operation_mode == "normal":
-                item["mode"] = "Normal"
-            else:
-                item["mode"] = "Normal"  # fallback for RL mode if not overridden
-
-    return output, {k: v["phase"] for k, v in results.items()}
+    if controller is not None:
+        return output, controller.phases(state.ids)
+    return output, {inter_no: PHASE_NAMES[p] for inter_no, p in zip(state.ids, phases)}
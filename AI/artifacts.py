@@ -0,0 +1,65 @@
+import datetime
+import hashlib
+import json
+import os
+
+DEFAULT_ARTIFACT_DIR = "models/artifacts"
+
+
+def _atomic_write(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_artifact(directory, name, payload, version, metadata=None):
+    """
+    Writes `payload` bytes to <directory>/<name>.bin next to a <name>.json manifest holding
+    the format version, a SHA-256 checksum and compatibility metadata.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {
+        "name": name,
+        "version": version,
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "size": len(payload),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "metadata": metadata or {},
+    }
+    # Payload first, manifest last: a manifest only ever describes a fully written payload.
+    _atomic_write(os.path.join(directory, name + ".bin"), payload)
+    _atomic_write(os.path.join(directory, name + ".json"), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+def load_artifact(directory, name, version, metadata=None):
+    """
+    Returns the payload bytes of a compatible artifact, or None when it is missing, was written
+    by another format version, has different metadata or fails its checksum.
+    """
+    manifest_path = os.path.join(directory, name + ".json")
+    payload_path = os.path.join(directory, name + ".bin")
+    if not os.path.exists(manifest_path) or not os.path.exists(payload_path):
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable artifact manifest {manifest_path}: {e}")
+        return None
+    if manifest.get("version") != version:
+        print(f"Ignoring artifact {name}: version {manifest.get('version')} does not match {version}")
+        return None
+    for key, value in (metadata or {}).items():
+        if manifest.get("metadata", {}).get(key) != value:
+            print(f"Ignoring artifact {name}: {key} does not match ({manifest.get('metadata', {}).get(key)} != {value})")
+            return None
+    with open(payload_path, "rb") as f:
+        payload = f.read()
+    if hashlib.sha256(payload).hexdigest() != manifest.get("sha256"):
+        print(f"Ignoring artifact {name}: checksum mismatch")
+        return None
+    return payload
@@ -0,0 +1,313 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+from algorithm import optimize_intersections
+from road_network import RoadNetwork
+from traffic_state import ROADS, VEHICLE_CLASSES
+
+DEFAULT_GRID_SIZES = (6, 100, 1000, 10000)
+DEFAULT_VIDEOS = ("data/sample_video4.mp4", "data/sample_video8.mp4")
+MODES = ("normal", "fuzzy", "ml", "rl")
+
+
+def measure(fn, min_time=1.0, min_runs=3, max_runs=100000):
+    """
+    Calls fn() until both `min_runs` calls and `min_time` seconds have passed.
+    Returns call counts, throughput and per-call latency quantiles.
+    """
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - start < min_time):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    samples = np.array(samples)
+    return {
+        "calls": len(samples),
+        "seconds": round(float(samples.sum()), 4),
+        "per_s": round(len(samples) / float(samples.sum()), 2) if samples.sum() > 0 else None,
+        "mean_ms": round(float(samples.mean()) * 1000, 4),
+        "p50_ms": round(float(np.quantile(samples, 0.5)) * 1000, 4),
+        "p95_ms": round(float(np.quantile(samples, 0.95)) * 1000, 4),
+    }
+
+
+def grid_shape(n):
+    """Most square rows x cols grid with exactly n intersections."""
+    rows = max(r for r in range(1, int(n ** 0.5) + 1) if n % r == 0)
+    return rows, n // rows
+
+
+def synthetic_traffic(n, rng, cars=8.0, emergency_rate=0.01, schoolbus_rate=0.02):
+    """
+    One tick of traffic_data and prediction_data for n intersections "1".."n".
+    Cars are Poisson distributed per road; ambulances and school buses are rare; no accidents,
+    so the optimizer's alert printing does not dominate the timings.
+    """
+    car = rng.poisson(cars, size=(n, len(ROADS)))
+    ambulance = (rng.random((n, len(ROADS))) < emergency_rate).astype(int)
+    schoolbus = (rng.random((n, len(ROADS))) < schoolbus_rate).astype(int)
+    predicted = car * rng.uniform(0.7, 1.3, size=car.shape)
+    traffic_data, prediction_data = {}, {}
+    for i in range(n):
+        inter_no = str(i + 1)
+        traffic_data[inter_no] = {road_no: {"car": int(car[i, r]), "ambulance": int(ambulance[i, r]),
+                                            "schoolbus": int(schoolbus[i, r]), "accident": 0}
+                                  for r, road_no in enumerate(ROADS)}
+        prediction_data[inter_no] = {road_no: {"car": float(predicted[i, r]), "ambulance": 0, "schoolbus": 0, "accident": 0}
+                                     for r, road_no in enumerate(ROADS)}
+    return traffic_data, prediction_data
+
+
+def load_controllers(modes):
+    """Trained ML model and a (freshly initialised) DQN agent, only for the modes that need them."""
+    rl_agent = ml_model = None
+    if "ml" in modes:
+        from ml_predictor import MLModel
+        ml_model = MLModel()
+        ml_model.train_model()
+    if "rl" in modes:
+        from rl_agent import DeepRLAgent
+        rl_agent = DeepRLAgent()
+    return rl_agent, ml_model
+
+
+def bench_optimize(grid_sizes, modes, rng, min_time):
+    rl_agent, ml_model = load_controllers(modes)
+    results = []
+    for n in grid_sizes:
+        rows, cols = grid_shape(n)
+        traffic_data, prediction_data = synthetic_traffic(n, rng)
+        network = RoadNetwork.from_grid(rows, cols)
+        for mode in modes:
+            config = {"operation_mode": "normal" if mode == "fuzzy" else mode, "use_fuzzy_logic": mode == "fuzzy",
+                      "grid": {"rows": rows, "cols": cols}, "school_bus_time": "15:00", "school_bus_intersection": "1",
+                      "last_school_bus_green": datetime.datetime.now()}
+            now = datetime.datetime(2024, 1, 1, 8, 30)
+            stats = measure(lambda: optimize_intersections(traffic_data, prediction_data, config, now,
+                                                           rl_agent, ml_model, network), min_time)
+            stats["intersections_per_s"] = round(stats["per_s"] * n, 1) if stats["per_s"] else None
+            results.append(dict({"intersections": n, "mode": mode}, **stats))
+    return results
+
+
+def bench_rl(min_time, train_episodes=256, num_envs=64, steps_per_episode=10):
+    from rl_agent import DeepRLAgent
+    agent = DeepRLAgent()
+    rng = np.random.default_rng(0)
+    states = rng.uniform(0, 30, size=(agent.batch_size * 16, agent.input_dim)).astype(np.float32)
+    actions = rng.integers(0, agent.output_dim, size=len(states))
+    rewards = -states[:, :2].sum(axis=1)
+    agent.replay_buffer.push_batch(states, actions, rewards, np.roll(states, 1, axis=0),
+                                   np.zeros(len(states), dtype=np.float32))
+    update = measure(agent.update, min_time)
+    train = measure(lambda: agent.train_agent(train_episodes, steps_per_episode, num_envs), min_time, min_runs=1)
+    # One train_agent call runs ceil(episodes / num_envs) * steps_per_episode vectorized steps.
+    train["steps_per_s"] = round(train["per_s"] * -(-train_episodes // num_envs) * steps_per_episode, 1) if train["per_s"] else None
+    print(f"DeepRLAgent.update: {update['per_s']} updates/s; train_agent: {train['steps_per_s']} steps/s")
+    return {"update": update, "train_agent": dict(train, episodes=train_episodes, num_envs=num_envs)}
+
+
+def bench_ml(min_time):
+    from ml_predictor import MLModel
+    model = MLModel()
+    model.train_model()
+    now = datetime.datetime(2024, 1, 1, 8, 30)
+    single = measure(lambda: model.predict_optimal_green(12.5, now), min_time)
+    counts = np.random.default_rng(0).uniform(0, 30, size=1000)
+    batch = measure(lambda: model.predict_batch(counts, now), min_time)
+    batch["predictions_per_s"] = round(batch["per_s"] * len(counts), 1) if batch["per_s"] else None
+    print(f"MLModel.predict_optimal_green: {single['per_s']} calls/s; predict_batch: {batch['predictions_per_s']} predictions/s")
+    return {"predict_optimal_green": single, "predict_batch_1000": batch}
+
+
+def bench_congestion_log(rng, ticks=2000, intersections=6):
+    """Rate of the legacy JSON-lines log_congestion and of the buffered CongestionLogWriter."""
+    from congestion_log import CongestionLogWriter
+    from utils import log_congestion
+    traffic_data, _ = synthetic_traffic(intersections, rng)
+    now = datetime.datetime(2024, 1, 1, 8, 30)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)  # log_congestion always appends to congestion_log.txt in the working directory
+        try:
+            start = time.perf_counter()
+            for _ in range(ticks):
+                log_congestion(traffic_data, now)
+            elapsed = time.perf_counter() - start
+            results["log_congestion"] = {"ticks": ticks, "seconds": round(elapsed, 4), "per_s": round(ticks / elapsed, 1)}
+        finally:
+            os.chdir(cwd)
+
+        writer = CongestionLogWriter(os.path.join(directory, "congestion_log.csv"), max_queue=ticks + 1)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            writer.log(traffic_data, now)
+        enqueued = time.perf_counter() - start
+        writer.close()
+        elapsed = time.perf_counter() - start
+        results["CongestionLogWriter"] = {"ticks": ticks, "enqueue_per_s": round(ticks / enqueued, 1),
+                                          "written_per_s": round(ticks / elapsed, 1), **writer.stats()}
+    print(f"log_congestion: {results['log_congestion']['per_s']} writes/s; "
+          f"CongestionLogWriter: {results['CongestionLogWriter']['written_per_s']} writes/s")
+    return results
+
+
+class StubDetector:
+    """
+    Stand-in for VehicleDetector with the same batch interfaces and no inference cost, so the
+    video benchmark measures everything around the model. Boxes come from a seeded generator.
+    """
+    def __init__(self, boxes_per_frame=3, seed=0):
+        self.boxes_per_frame = boxes_per_frame
+        self.rng = np.random.default_rng(seed)
+
+    def detect_arrays(self, frames):
+        results = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            n = self.rng.integers(0, 2 * self.boxes_per_frame + 1)
+            x1 = self.rng.integers(0, max(1, w - 8), size=n)
+            y1 = self.rng.integers(0, max(1, h - 8), size=n)
+            boxes = np.stack([x1, y1, np.minimum(x1 + 8, w), np.minimum(y1 + 8, h)], axis=1).astype(np.int32)
+            classes = self.rng.choice(len(VEHICLE_CLASSES), size=n, p=(0.94, 0.02, 0.04, 0.0))
+            results.append((boxes, np.ones(n, dtype=np.float32), classes))
+        return results
+
+    def detect_batch(self, frames):
+        return [[{"bbox": tuple(box), "confidence": 1.0, "class": VEHICLE_CLASSES[cls]}
+                 for box, cls in zip(boxes.tolist(), classes.tolist())]
+                for boxes, _, classes in self.detect_arrays(frames)]
+
+
+def bench_video(path, config, detector_kind, max_frames):
+    """
+    Frames per second of the in-process loop: decode, detect, EMA prediction and optimize.
+    Drawing, the uplink and the congestion log are left out.
+    """
+    import cv2
+    from cameras import compute_intersections_from_grid, build_roi_detector, detect_traffic
+    from roi_index import ROILayout, ROIIndex
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {path}.")
+        return {"video": path, "error": "could not open video"}
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if "grid" in config:
+        intersections_config = compute_intersections_from_grid(config["grid"], frame_width, frame_height)
+    else:
+        intersections_config = config.get("intersections", {})
+    detection_mode = config.get("detection_mode", "roi")
+    layout = ROILayout(intersections_config, frame_width, frame_height)
+    if detector_kind == "real":
+        from model import VehicleDetector
+        detector = VehicleDetector.from_config(config.get("detector"), layout.sizes() if detection_mode == "roi" else None)
+    else:
+        detector = StubDetector()
+    roi_index = ROIIndex(intersections_config, frame_width, frame_height) if detection_mode == "full_frame" else None
+    roi_detector = build_roi_detector(detector, config)
+    network = RoadNetwork.from_config(config, list(intersections_config.keys()))
+    config = dict(config, operation_mode="normal", last_school_bus_green=datetime.datetime.now())
+    alpha = config.get("prediction_alpha", 0.7)
+    prediction_data = layout.empty_traffic_data()
+
+    stages = {"decode": 0.0, "detect": 0.0, "optimize": 0.0}
+    frames = 0
+    start = time.perf_counter()
+    while frames < max_frames:
+        t = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        t1 = time.perf_counter()
+        traffic_data = detect_traffic(detector, frame, layout, roi_index, False, roi_detector)
+        t2 = time.perf_counter()
+        for inter_no, roads in traffic_data.items():
+            for road_no, counts in roads.items():
+                predicted = prediction_data[inter_no][road_no]
+                predicted["car"] = alpha * counts["car"] + (1 - alpha) * predicted["car"]
+        optimize_intersections(traffic_data, prediction_data, config, datetime.datetime.now(), network=network)
+        t3 = time.perf_counter()
+        stages["decode"] += t1 - t
+        stages["detect"] += t2 - t1
+        stages["optimize"] += t3 - t2
+        frames += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    result = {
+        "video": path, "detector": detector_kind, "detection_mode": detection_mode,
+        "resolution": [frame_width, frame_height], "frames": frames, "seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed else None,
+        "stage_ms_per_frame": {stage: round(total / frames * 1000, 3) for stage, total in stages.items()} if frames else {},
+    }
+    if hasattr(roi_detector, "stats"):
+        result["roi_detector"] = roi_detector.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the control and detection paths on synthetic workloads.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--suites", nargs="+", choices=["optimize", "rl", "ml", "log", "video"],
+                        default=["optimize", "rl", "ml", "log", "video"])
+    parser.add_argument("--grid-sizes", nargs="+", type=int, default=list(DEFAULT_GRID_SIZES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--videos", nargs="+", default=list(DEFAULT_VIDEOS))
+    parser.add_argument("--detector", choices=["stub", "real"], default="stub")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--min-time", type=float, default=1.0, help="minimum seconds spent on each measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    np.random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "seed": args.seed,
+        "results": {},
+    }
+    results = report["results"]
+    with open(os.devnull, "w") as devnull:
+        # The optimizer prints per-intersection notices; keep them out of the timings and the console.
+        if "optimize" in args.suites:
+            with contextlib.redirect_stdout(devnull):
+                results["optimize_intersections"] = bench_optimize(args.grid_sizes, args.modes, rng, args.min_time)
+            for row in results["optimize_intersections"]:
+                print(f"optimize_intersections n={row['intersections']} {row['mode']}: "
+                      f"{row['per_s']} ticks/s, p95 {row['p95_ms']} ms")
+        if "rl" in args.suites:
+            results["rl_agent"] = bench_rl(args.min_time)
+        if "ml" in args.suites:
+            results["ml_model"] = bench_ml(args.min_time)
+        if "log" in args.suites:
+            results["congestion_log"] = bench_congestion_log(rng)
+        if "video" in args.suites:
+            with contextlib.redirect_stdout(devnull):
+                results["end_to_end"] = [bench_video(path, config, args.detector, args.max_frames) for path in args.videos]
+            for row in results["end_to_end"]:
+                print(f"{row['video']} ({args.detector} detector): {row.get('fps')} fps over {row.get('frames', 0)} frames")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
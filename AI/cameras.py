@@ -0,0 +1,351 @@
+import threading
+import time
+import cv2
+import numpy as np
+from capture import FrameCapture
+from roi_index import ROILayout, ROIIndex
+from traffic_state import VEHICLE_CLASSES
+from utils import draw_detections, draw_boxes
+
+
+def compute_intersections_from_grid(grid_config, frame_width, frame_height):
+    """
+    Computes intersection ROIs given grid parameters.
+    Each intersection has four road ROIs (north, south, east, west).
+    """
+    intersections = {}
+    rows = grid_config["rows"]
+    cols = grid_config["cols"]
+    roi_width = grid_config["roi_width"]
+    roi_height = grid_config["roi_height"]
+
+    cell_width = frame_width / cols
+    cell_height = frame_height / rows
+    inter_id = 1
+    for row in range(rows):
+        for col in range(cols):
+            base_x = col * cell_width
+            base_y = row * cell_height
+            intersections[str(inter_id)] = {
+                "roads": {
+                    "north": [int(base_x + cell_width/2 - roi_width/2), int(base_y + cell_height/4 - roi_height/2), roi_width, roi_height],
+                    "south": [int(base_x + cell_width/2 - roi_width/2), int(base_y + 3*cell_height/4 - roi_height/2), roi_width, roi_height],
+                    "east":  [int(base_x + 3*cell_width/4 - roi_width/2), int(base_y + cell_height/2 - roi_height/2), roi_width, roi_height],
+                    "west":  [int(base_x + cell_width/4 - roi_width/2), int(base_y + cell_height/2 - roi_height/2), roi_width, roi_height]
+                }
+            }
+            inter_id += 1
+    return intersections
+
+
+def feature_config(config, key):
+    """
+    Settings of the optional feature `key`: `true` or a dict turns it on (`{}` uses the defaults)
+    unless the dict sets "enabled": false. None when the feature is off.
+    """
+    value = config.get(key)
+    if value is True:
+        return {}
+    if isinstance(value, dict) and value.get("enabled", True):
+        return value
+    return None
+
+
+def build_roi_detector(detector, config):
+    """
+    Wraps the in-process detector in the per-ROI schedulers enabled in `config`: "tracking"
+    (AdaptiveDetector) and, in front of it, "motion_gate" (MotionGate). None when neither is enabled.
+    """
+    roi_detector = None
+    tracking_config = feature_config(config, "tracking")
+    if tracking_config is not None:
+        from tracker import AdaptiveDetector
+        roi_detector = AdaptiveDetector.from_config(detector, tracking_config)
+    gate_config = feature_config(config, "motion_gate")
+    if gate_config is not None:
+        from motion_gate import MotionGate
+        roi_detector = MotionGate.from_config(roi_detector or detector, gate_config)
+    return roi_detector
+
+
+def detect_traffic(detector, frame, layout, roi_index=None, draw=False, roi_detector=None):
+    """
+    Runs the in-process detector on a native-resolution frame and returns per-road class counts
+    in the traffic_data layout. With a roi_index the whole frame is detected once; otherwise
+    the zero-copy crops of the compiled ROILayout go through the detector as one batch.
+    A keyed `roi_detector` (see build_roi_detector) decides per crop whether the detector runs.
+    """
+    if roi_index is not None:
+        if roi_detector is not None:
+            detections = roi_detector.detect_batch([frame], ["frame"])[0]
+            if draw:
+                draw_detections(frame, detections)
+            return roi_index.count(detections)
+        boxes, _, classes = detector.detect_arrays([frame])[0]
+        if draw:
+            draw_boxes(frame, boxes)
+        return roi_index.to_traffic_data(roi_index.count_arrays(boxes, classes))
+
+    traffic_data = layout.empty_traffic_data()
+    roi_frames = layout.crops(frame)
+    if roi_detector is not None:
+        # Schedulers hand back per-box dicts (tracked or cached detections).
+        batch_detections = roi_detector.detect_batch(roi_frames, layout.keys)
+        for (inter_no, road_no), roi_frame, detections in zip(layout.keys, roi_frames, batch_detections):
+            counts = traffic_data[inter_no][road_no]
+            for detection in detections:
+                if detection['class'] in counts:
+                    counts[detection['class']] += 1
+            if draw:
+                draw_detections(roi_frame, detections)
+        return traffic_data
+
+    # Gather traffic counts from each ROI.
+    for (inter_no, road_no), roi_frame, (boxes, _, classes) in zip(layout.keys, roi_frames, detector.detect_arrays(roi_frames)):
+        traffic_data[inter_no][road_no] = dict(zip(VEHICLE_CLASSES, np.bincount(classes, minlength=len(VEHICLE_CLASSES)).tolist()))
+        if draw:
+            draw_boxes(roi_frame, boxes)
+    return traffic_data
+
+
+class CameraFeed:
+    """
+    One camera source with its own capture thread and detection pipeline.
+    ROIs are keyed by global intersection IDs, so the traffic_data it publishes can be merged
+    with other feeds as-is. Detection runs on the feed's own thread with an in-process
+    VehicleDetector, or in `detector_workers` processes through a DetectorPool.
+    """
+    def __init__(self, name, camera_config, detection_mode="roi", id_offset=0, keep_frames=False, detector_config=None,
+                 metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self.source = camera_config.get("source", 0)
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open camera {name} ({self.source})")
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.detection_mode = detection_mode
+        self.detector_workers = camera_config.get("detector_workers", 0)
+        self.camera_config = camera_config
+        self.detector_config = camera_config.get("detector", detector_config)
+        self.keep_frames = keep_frames
+        self.intersections = self._global_intersections(camera_config, id_offset)
+        self.layout = ROILayout(self.intersections, self.frame_width, self.frame_height)
+        self.capture = FrameCapture(self.cap, camera_config.get("capture_queue_size", 1), camera_config.get("capture_policy", "latest"))
+        self.latest = None
+        self.updates = 0
+        self.detections = 0
+        self.ended = False
+        self.running = False
+        self.thread = None
+        self.on_update = None
+        self.detector = None
+        self.roi_detector = None
+        self.roi_index = None
+        self.pool = None
+
+    def _global_intersections(self, camera_config, id_offset):
+        # Explicit "intersections" blocks are keyed by global IDs already; grid cells are numbered
+        # through "intersection_ids" when given, otherwise continuing after the previous camera.
+        if "intersections" in camera_config:
+            return dict(camera_config["intersections"])
+        local = compute_intersections_from_grid(camera_config["grid"], self.frame_width, self.frame_height)
+        ids = camera_config.get("intersection_ids")
+        if ids is None:
+            ids = [str(id_offset + int(local_id)) for local_id in local]
+        if len(ids) != len(local):
+            raise ValueError(f"Camera {self.name}: {len(ids)} intersection_ids for {len(local)} grid intersections")
+        return {str(global_id): inter_data for global_id, inter_data in zip(ids, local.values())}
+
+    def prepare(self):
+        """Loads the detector (or starts the worker pool) before any frame is captured."""
+        if self.detector_workers > 0:
+            from detector_pool import DetectorPool
+            self.pool = DetectorPool(self.intersections, self.frame_width, self.frame_height, self.detector_workers,
+                                     detection_mode=self.detection_mode, detector_config=self.detector_config).start()
+        else:
+            from model import VehicleDetector
+            self.detector = VehicleDetector.from_config(self.detector_config, self.layout.sizes() if self.detection_mode == "roi" else None)
+            self.roi_detector = build_roi_detector(self.detector, self.camera_config)
+            if self.detection_mode == "full_frame":
+                self.roi_index = ROIIndex(self.intersections, self.frame_width, self.frame_height)
+        return self
+
+    def start(self, on_update):
+        self.on_update = on_update
+        self.capture.start()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"camera-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def _read(self, timeout):
+        ret, frame, captured_at = self.capture.read(timeout)
+        if not ret and self.capture.finished:
+            self.running = False
+        return ret, frame, captured_at
+
+    def _publish(self, traffic_data, captured_at, frame):
+        self.latest = (traffic_data, captured_at, frame if self.keep_frames else None)
+        self.updates += 1
+        self.on_update(self)
+
+    def _run(self):
+        try:
+            if self.pool is not None:
+                self._run_pool()
+            else:
+                self._run_local()
+        except Exception as e:
+            print(f"Camera {self.name} stopped: {e}")
+        self.ended = True
+        self.on_update(self)
+
+    def _run_local(self):
+        while self.running:
+            ret, frame, captured_at = self._read(0.5)
+            if not ret:
+                continue
+            start = time.perf_counter()
+            traffic_data = detect_traffic(self.detector, frame, self.layout, self.roi_index, self.keep_frames, self.roi_detector)
+            if self.metrics is not None:
+                self.metrics.observe("detect", time.perf_counter() - start)
+            self.detections += 1
+            self._publish(traffic_data, captured_at, frame)
+
+    def _run_pool(self):
+        while self.running or self.pool.in_flight():
+            while self.running and self.pool.free_slots():
+                ret, frame, captured_at = self._read(0 if self.pool.in_flight() else 0.5)
+                if not ret:
+                    break
+                self.pool.submit(frame, captured_at)
+            if not self.pool.in_flight():
+                continue
+            start = time.perf_counter()
+            traffic_data, captured_at, frame = self.pool.next_result(copy_frame=self.keep_frames)
+            if self.metrics is not None:
+                # Time spent waiting on the pool for the oldest frame in flight.
+                self.metrics.observe("detect", time.perf_counter() - start)
+            self.detections += 1
+            self._publish(traffic_data, captured_at, frame)
+
+    def roi_inferences(self):
+        """Detector runs per (global intersection, road) ROI of this feed."""
+        if self.roi_detector is not None:
+            return self.roi_detector.roi_inferences()
+        if self.pool is not None:
+            return self.pool.roi_inferences()
+        return {key: self.detections for key in self.layout.keys}
+
+    def stop(self):
+        self.running = False
+        self.capture.stop()
+        if self.thread is not None:
+            self.thread.join(timeout=5.0)
+        if self.pool is not None:
+            self.pool.close()
+        self.cap.release()
+
+
+class CameraCoordinator:
+    """
+    Runs one CameraFeed per configured camera and merges the traffic_data they published since
+    the previous tick into one network-wide tick, so every camera frame is counted exactly once
+    downstream (EMA, congestion log). A tick never waits for a slow camera: intersections of a
+    feed with nothing new are left out and keep their running signal plan. Feeds silent for more
+    than `stale_after` seconds are reported as stale, and for more than `max_age` as dropped.
+    """
+    def __init__(self, cameras_config, detection_mode="roi", stale_after=2.0, max_age=10.0, keep_frames=False,
+                 detector_config=None, metrics=None):
+        self.feeds = []
+        self.intersections = {}
+        id_offset = 0
+        for index, camera_config in enumerate(cameras_config):
+            feed = CameraFeed(camera_config.get("name", str(index)), camera_config, detection_mode, id_offset, keep_frames,
+                              detector_config, metrics)
+            overlap = set(feed.intersections) & set(self.intersections)
+            if overlap:
+                raise ValueError(f"Camera {feed.name} reuses intersection IDs {sorted(overlap)}")
+            self.intersections.update(feed.intersections)
+            self.feeds.append(feed)
+            id_offset += len(feed.intersections)
+        self.stale_after = stale_after
+        self.max_age = max_age
+        self.condition = threading.Condition()
+        self.seen = {feed.name: 0 for feed in self.feeds}
+        self.status = {feed.name: "waiting" for feed in self.feeds}
+        self.merged = []
+
+    def start(self):
+        # Load every detector first so no feed starts capturing while another is still loading.
+        for feed in self.feeds:
+            feed.prepare()
+        for feed in self.feeds:
+            feed.start(self._notify)
+        return self
+
+    def _notify(self, feed):
+        with self.condition:
+            self.condition.notify_all()
+
+    def _has_news(self):
+        return any(feed.updates != self.seen[feed.name] for feed in self.feeds) or all(feed.ended for feed in self.feeds)
+
+    def next_tick(self, timeout=1.0):
+        """
+        Waits up to `timeout` seconds for any feed to publish, then merges the data of the feeds that
+        published since the last tick. Returns (traffic_data, captured_at, frames) where captured_at
+        is the oldest capture time merged in and frames maps feed names to their new frame (when
+        keep_frames is set); traffic_data is empty when nothing new arrived.
+        Returns (None, None, None) once every feed has ended.
+        Call record_decision() once the merged data has been acted on.
+        """
+        with self.condition:
+            self.condition.wait_for(self._has_news, timeout)
+        if all(feed.ended for feed in self.feeds):
+            return None, None, None
+
+        now = time.monotonic()
+        traffic_data = {}
+        frames = {}
+        oldest = None
+        self.merged = []
+        for feed in self.feeds:
+            latest = feed.latest
+            age = now - latest[1] if latest is not None else None
+            if age is None or age > self.max_age or feed.ended:
+                status = "ended" if feed.ended else ("waiting" if age is None else "dropped")
+            else:
+                status = "stale" if age > self.stale_after else "fresh"
+            if status in ("fresh", "stale") and feed.updates != self.seen[feed.name]:
+                feed_data, captured_at, frame = latest
+                traffic_data.update(feed_data)
+                if frame is not None:
+                    frames[feed.name] = (frame, feed.intersections)
+                self.merged.append((feed, captured_at))
+                oldest = captured_at if oldest is None else min(oldest, captured_at)
+            if status != self.status[feed.name]:
+                print(f"Camera {feed.name} is {status}" + (f" ({age:.1f}s old)" if age is not None else ""))
+                self.status[feed.name] = status
+            self.seen[feed.name] = feed.updates
+        return traffic_data, oldest if oldest is not None else now, frames
+
+    def record_decision(self):
+        """Records the capture-to-decision latency of every feed merged into the last tick."""
+        for feed, captured_at in self.merged:
+            feed.capture.record_decision(captured_at)
+        self.merged = []
+
+    def stats(self):
+        stats = {}
+        for feed in self.feeds:
+            stats[feed.name] = dict(feed.capture.stats(), status=self.status[feed.name], intersections=len(feed.intersections))
+            if feed.roi_detector is not None:
+                stats[feed.name]["roi_detector"] = feed.roi_detector.stats()
+        return stats
+
+    def stop(self):
+        for feed in self.feeds:
+            feed.stop()
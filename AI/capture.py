@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+
+
+class FrameCapture:
+    """
+    Decodes frames from a cv2.VideoCapture on its own thread into a bounded ring queue.
+    policy="drop_oldest" hands frames out in order and evicts the oldest when the queue is full;
+    policy="latest" always hands out the newest frame and discards everything older.
+    """
+    policies = ("drop_oldest", "latest")
+
+    def __init__(self, cap, queue_size=2, policy="drop_oldest"):
+        if policy not in self.policies:
+            raise ValueError(f"Unknown capture policy: {policy}")
+        self.cap = cap
+        self.policy = policy
+        self.frames = deque(maxlen=max(1, queue_size))
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.finished = False
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="frame-capture", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            captured_at = time.monotonic()
+            with self.condition:
+                if not ret:
+                    self.finished = True
+                    self.condition.notify_all()
+                    return
+                if len(self.frames) == self.frames.maxlen:
+                    self.dropped += 1
+                self.frames.append((frame, captured_at))
+                self.captured += 1
+                self.condition.notify()
+
+    def read(self, timeout=None):
+        """
+        Returns (ret, frame, captured_at) like cv2.VideoCapture.read plus the monotonic capture time.
+        ret is False once the source is exhausted and every queued frame has been consumed.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frames or self.finished or not self.running, timeout):
+                return False, None, None
+            if not self.frames:
+                return False, None, None
+            if self.policy == "latest":
+                self.dropped += len(self.frames) - 1
+                frame, captured_at = self.frames.pop()
+                self.frames.clear()
+            else:
+                frame, captured_at = self.frames.popleft()
+            return True, frame, captured_at
+
+    def exhausted(self):
+        """True once the source has ended (or the capture stopped) and every queued frame was read."""
+        with self.condition:
+            return (self.finished or not self.running) and not self.frames
+
+    def record_decision(self, captured_at):
+        """Records the capture-to-decision latency of a frame once its signals are computed."""
+        latency = time.monotonic() - captured_at
+        self.processed += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        return latency
+
+    def stats(self):
+        with self.condition:
+            queued = len(self.frames)
+        return {
+            "captured_frames": self.captured,
+            "processed_frames": self.processed,
+            "dropped_frames": self.dropped,
+            "queued_frames": queued,
+            "last_latency_ms": round(self.last_latency * 1000, 1),
+            "avg_latency_ms": round(self.total_latency / self.processed * 1000, 1) if self.processed else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+        }
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
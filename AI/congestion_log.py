@@ -0,0 +1,228 @@
+import datetime
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from traffic_state import VEHICLE_CLASSES
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = ("tick", "timestamp", "intersection", "road") + VEHICLE_CLASSES
+
+
+class CongestionLogWriter:
+    """
+    Buffered, rotating congestion log.
+    log() only enqueues the tick; a background thread formats it as compact CSV rows
+    (one per road, fixed columns) and flushes every `flush_interval` seconds. The active file
+    is rotated to `<name>.<YYYYmmdd_HHMMSS_ffffff><ext>` once it exceeds `max_bytes` or is older
+    than `rotate_interval` seconds, keeping at most `backup_count` rotated files.
+    I/O errors are reported and the affected ticks dropped; the file is reopened on the next tick.
+    """
+    def __init__(self, path="congestion_log.csv", max_bytes=50 * 1024 * 1024, rotate_interval=24 * 3600,
+                 backup_count=30, flush_interval=1.0, max_queue=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.tick = 0
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+        self.failing = False
+        self.file = None
+        self.opened_at = 0.0
+        self.thread = threading.Thread(target=self._run, name="congestion-log", daemon=True)
+        self.thread.start()
+
+    def log(self, traffic_data, current_time):
+        self.tick += 1
+        try:
+            self.queue.put_nowait((self.tick, current_time, traffic_data))
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "a", buffering=1024 * 1024)
+        self.opened_at = time.time()
+        if is_new:
+            self.file.write(",".join(COLUMNS) + "\n")
+
+    def rotated_path(self):
+        stem, ext = os.path.splitext(self.path)
+        # Fixed-width stamps keep rotated files sorting chronologically by name.
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return f"{stem}.{timestamp}{ext}"
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if not os.path.exists(self.path):
+            return None
+        target = self.rotated_path()
+        os.replace(self.path, target)
+        if self.backup_count:
+            for old in rotated_logs(self.path)[:-self.backup_count]:
+                os.remove(old)
+        return target
+
+    def _write(self, tick, current_time, traffic_data):
+        if self.file is None:
+            self._open()
+        timestamp = current_time.strftime(TIMESTAMP_FORMAT)
+        rows = []
+        for inter_no, roads in traffic_data.items():
+            for road_no, counts in roads.items():
+                rows.append(f"{tick},{timestamp},{inter_no},{road_no},"
+                            + ",".join(str(counts.get(c, 0)) for c in VEHICLE_CLASSES))
+        self.file.write("\n".join(rows) + "\n")
+        self.written += 1
+
+    def _failed(self, e):
+        self.errors += 1
+        if not self.failing:
+            print(f"Congestion log write failed, dropping ticks until it recovers: {e}")
+            self.failing = True
+        # Drop the handle (and whatever it buffered) so the next tick starts from a fresh open().
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item == "stop":
+                break
+            if isinstance(item, tuple) and item[0] == "rotate":
+                try:
+                    item[1].append(self._rotate())
+                except OSError as e:
+                    self._failed(e)
+                    item[1].append(None)
+                item[2].set()
+                continue
+            try:
+                if item is not None:
+                    self._write(*item)
+                    if (self.file.tell() >= self.max_bytes
+                            or (self.rotate_interval and time.time() - self.opened_at >= self.rotate_interval)):
+                        self._rotate()
+                if self.file is not None and time.monotonic() - last_flush >= self.flush_interval:
+                    self.file.flush()
+                    last_flush = time.monotonic()
+                if item is not None and self.failing:
+                    print("Congestion log writes recovered.")
+                    self.failing = False
+            except OSError as e:
+                self._failed(e)
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError as e:
+                self._failed(e)
+            self.file = None
+
+    def _put(self, item, timeout=1.0):
+        # Never block on a writer thread that is gone: nothing would ever drain the queue.
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def rotate(self):
+        """
+        Rotates the active file after everything queued so far is written; returns the rotated path,
+        or None when there was nothing to rotate, rotating failed or the writer thread is gone.
+        """
+        result, done = [], threading.Event()
+        if not self._put(("rotate", result, done)):
+            return None
+        while not done.wait(1.0):
+            if not self.thread.is_alive():
+                return None
+        return result[0]
+
+    def close(self, rotate=False):
+        rotated = self.rotate() if rotate else None
+        if self._put("stop"):
+            self.thread.join()
+        return rotated
+
+    def stats(self):
+        return {"ticks_written": self.written, "ticks_dropped": self.dropped, "write_errors": self.errors,
+                "queue_depth": self.queue.qsize()}
+
+
+def rotated_logs(path):
+    """Rotated files of a log in chronological order (oldest first)."""
+    stem, ext = os.path.splitext(path)
+    return sorted(p for p in glob.glob(f"{glob.escape(stem)}.*{ext}") if p != path)
+
+
+def read_congestion_log(paths):
+    """
+    Streams (timestamp, traffic_data) ticks from one or more congestion logs in constant memory.
+    Accepts both the compact CSV format and the original JSON-lines congestion_log.txt format.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        with open(path, "r") as f:
+            first = f.readline()
+            if not first:
+                continue
+            if first.lstrip().startswith("{"):
+                yield from _read_jsonl(first, f)
+            else:
+                yield from _read_compact(first, f)
+
+
+def _read_jsonl(first, f):
+    for line in _chain(first, f):
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        yield datetime.datetime.strptime(entry["timestamp"], TIMESTAMP_FORMAT), entry["traffic_data"]
+
+
+def _read_compact(header, f):
+    columns = header.strip().split(",")
+    col = {name: i for i, name in enumerate(columns)}
+    class_cols = [(c, col[c]) for c in VEHICLE_CLASSES if c in col]
+    current_tick, timestamp, traffic_data = None, None, {}
+    for line in f:
+        fields = line.rstrip("\n").split(",")
+        if len(fields) != len(columns):
+            continue
+        tick = fields[col["tick"]]
+        if tick != current_tick:
+            if current_tick is not None:
+                yield timestamp, traffic_data
+            current_tick, traffic_data = tick, {}
+            timestamp = datetime.datetime.strptime(fields[col["timestamp"]], TIMESTAMP_FORMAT)
+        traffic_data.setdefault(fields[col["intersection"]], {})[fields[col["road"]]] = {
+            c: int(fields[i]) for c, i in class_cols
+        }
+    if current_tick is not None:
+        yield timestamp, traffic_data
+
+
+def _chain(first, f):
+    yield first
+    yield from f
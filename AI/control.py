@@ -0,0 +1,76 @@
+import asyncio
+import signal
+from collections import deque
+
+
+class ControlChannel:
+    """
+    Non-blocking control channel for runs without a display window.
+    Commands arrive from POSIX signals (SIGUSR1 cycles the mode, SIGTERM quits) and,
+    when a port is given, from a line-based TCP socket on localhost, e.g.
+    `echo "mode rl" | nc 127.0.0.1 8765`. Supported commands: next, mode <name>, profile [seconds], quit.
+    The main loop drains the queued commands every tick; it waits for frames and detections for at
+    most POLL_INTERVAL, so a stalled camera or detector never keeps a quit from being handled.
+    """
+    def __init__(self, port=None, host="127.0.0.1"):
+        self.port = port
+        self.host = host
+        self.commands = deque()
+        self.server = None
+        self.clients = set()
+        self.signals = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for signum, command in ((getattr(signal, "SIGUSR1", None), "next"), (getattr(signal, "SIGTERM", None), "quit")):
+            if signum is None:
+                continue
+            try:
+                loop.add_signal_handler(signum, self.commands.append, command)
+                self.signals.append(signum)
+            except (NotImplementedError, RuntimeError):
+                pass  # Signal handlers are unavailable on this platform/thread.
+        if self.port:
+            self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+            print(f"Control channel listening on {self.host}:{self.port}")
+        return self
+
+    async def _handle_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="ignore").strip().lower()
+                if command in ("next", "quit", "profile") or command.startswith(("mode ", "profile ")):
+                    self.commands.append(command)
+                    writer.write(b"ok\n")
+                else:
+                    writer.write(b"unknown command\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def push(self, command):
+        self.commands.append(command)
+
+    def drain(self):
+        while self.commands:
+            yield self.commands.popleft()
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for signum in self.signals:
+            loop.remove_signal_handler(signum)
+        self.signals = []
+        if self.server is not None:
+            self.server.close()
+            # Drop lingering client connections so shutdown never waits on an idle socket.
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,232 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from traffic_state import VEHICLE_CLASSES
+from roi_index import ROILayout, ROIIndex
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _detector_worker(worker_id, spec, tasks, results):
+    """
+    Worker process: loads its own VehicleDetector, then detects every frame slot it is handed and
+    writes the per-ROI class counts straight into the shared counts array.
+    """
+    import torch
+    from model import VehicleDetector
+
+    torch.set_num_threads(spec["threads"])
+    frame_shm, frames = _attach(spec["frames"], spec["frame_shape"], np.uint8)
+    count_shm, counts = _attach(spec["counts"], spec["count_shape"], np.int32)
+    # Rows of the counts array and the compiled slices of every valid ROI.
+    rois = [(row, (slice(y1, y2), slice(x1, x2))) for row, (x1, y1, x2, y2) in spec["rois"]]
+    roi_index = None
+    try:
+        roi_sizes = [(x2 - x1, y2 - y1) for _, (x1, y1, x2, y2) in spec["rois"]]
+        detector = VehicleDetector.from_config(spec["detector_config"], roi_sizes if spec["detection_mode"] == "roi" else None)
+        if spec["detection_mode"] == "full_frame":
+            roi_index = ROIIndex(spec["intersections"], spec["frame_shape"][2], spec["frame_shape"][1])
+    except Exception as e:
+        results.put((-1, -1, worker_id, f"{type(e).__name__}: {e}"))
+        return
+    results.put((-1, -1, worker_id, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, slot = task
+        error = None
+        try:
+            frame = frames[slot]
+            slot_counts = counts[slot]
+            slot_counts[:] = 0
+            if roi_index is not None:
+                boxes, _, classes = detector.detect_arrays([frame])[0]
+                slot_counts += roi_index.count_arrays(boxes, classes)
+            else:
+                batch = detector.detect_arrays([frame[sy, sx] for _, (sy, sx) in rois])
+                for (i, _), (_, _, classes) in zip(rois, batch):
+                    slot_counts[i] = np.bincount(classes, minlength=len(VEHICLE_CLASSES))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        results.put((seq, slot, worker_id, error))
+
+    del frames, counts
+    frame_shm.close()
+    count_shm.close()
+
+
+class DetectorPool:
+    """
+    Runs vehicle detection in `num_workers` processes, each with its own VehicleDetector.
+    Frames are copied once into a shared-memory ring of `slots` frame buffers; workers crop them
+    at native resolution through zero-copy NumPy views and write (roads x classes) counts into a second shared array,
+    so only (seq, slot) pairs travel through the queues. Results are handed back in submission order.
+    """
+    def __init__(self, intersections_config, frame_width, frame_height, num_workers=2, slots=None,
+                 detection_mode="roi", detector_config=None, threads_per_worker=None):
+        layout = ROILayout(intersections_config, frame_width, frame_height)
+        self.keys = layout.order
+        self.roi_keys = list(layout.keys)
+        row = {key: i for i, key in enumerate(self.keys)}
+        rois = [(row[key], tuple(rect)) for key, rect in zip(layout.keys, layout.rects.tolist())]
+
+        self.num_slots = slots or 2 * num_workers
+        frame_shape = (self.num_slots, frame_height, frame_width, 3)
+        count_shape = (self.num_slots, len(self.keys), len(VEHICLE_CLASSES))
+        self.frame_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(frame_shape)))
+        self.count_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(count_shape)) * 4 or 4)
+        self.frames = np.ndarray(frame_shape, dtype=np.uint8, buffer=self.frame_shm.buf)
+        self.counts = np.ndarray(count_shape, dtype=np.int32, buffer=self.count_shm.buf)
+
+        spec = {
+            "frames": self.frame_shm.name, "frame_shape": frame_shape,
+            "counts": self.count_shm.name, "count_shape": count_shape,
+            "rois": rois, "intersections": intersections_config,
+            "detection_mode": detection_mode, "detector_config": detector_config,
+            "threads": threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers),
+        }
+        # spawn, not fork: each worker initialises torch itself instead of inheriting a forked copy.
+        context = mp.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.workers = [context.Process(target=_detector_worker, args=(i, spec, self.tasks, self.results),
+                                        name=f"detector-{i}", daemon=True) for i in range(num_workers)]
+        self.free = list(range(self.num_slots))
+        self.pending = {}
+        self.done = {}
+        self.next_seq = 0
+        self.emit_seq = 0
+        self.processed = [0] * num_workers
+        self.errors = 0
+        self.closed = False
+
+    def start(self, timeout=300.0):
+        """
+        Starts the workers and waits until every one of them has loaded its model. The first worker
+        starts alone so that a configured model export is written once and reused by the rest.
+        """
+        deadline = time.monotonic() + timeout
+        for batch in (self.workers[:1], self.workers[1:]):
+            for worker in batch:
+                worker.start()
+            for _ in batch:
+                seq, _, worker_id, error = self._get(deadline - time.monotonic())
+                if error is not None:
+                    self.close()
+                    raise RuntimeError(f"Detector worker {worker_id} failed to start: {error}")
+        return self
+
+    def _get(self, timeout):
+        # Poll so that a crashed worker surfaces as an error instead of a hang. Workers that have
+        # not been started yet (see start()) have no exit code and are not mistaken for dead ones.
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            try:
+                return self.results.get(timeout=min(1.0, max(0.01, deadline - time.monotonic())))
+            except queue.Empty:
+                dead = [w.name for w in self.workers if w.exitcode is not None]
+                if dead:
+                    raise RuntimeError(f"Detector worker(s) exited unexpectedly: {', '.join(dead)}")
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("Timed out waiting for detector workers")
+
+    def free_slots(self):
+        return len(self.free)
+
+    def in_flight(self):
+        return len(self.pending)
+
+    def submit(self, frame, captured_at):
+        """Copies `frame` into a free ring slot and queues it; returns False when the ring is full."""
+        if not self.free:
+            return False
+        slot = self.free.pop()
+        np.copyto(self.frames[slot], frame)
+        self.pending[self.next_seq] = (slot, captured_at)
+        self.tasks.put((self.next_seq, slot))
+        self.next_seq += 1
+        return True
+
+    def _receive(self, timeout):
+        seq, slot, worker_id, error = self._get(timeout)
+        if error is not None:
+            self.errors += 1
+            print(f"Detection failed on worker {worker_id}: {error}")
+        self.processed[worker_id] += 1
+        self.done[seq] = error
+
+    def ready(self, timeout, max_wait=300.0):
+        """
+        Waits up to `timeout` seconds for the oldest submitted frame; True once next_result() returns
+        without blocking. Raises TimeoutError when that frame has been waiting for over `max_wait` seconds.
+        """
+        if not self.pending:
+            raise RuntimeError("No frames in flight")
+        deadline = time.monotonic() + timeout
+        while self.emit_seq not in self.done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if time.monotonic() - self.pending[self.emit_seq][1] > max_wait:
+                    raise TimeoutError("Timed out waiting for detector workers")
+                return False
+            try:
+                self._receive(remaining)
+            except TimeoutError:
+                pass
+        return True
+
+    def next_result(self, copy_frame=False, timeout=300.0):
+        """
+        Blocks until the oldest submitted frame is processed. Returns (traffic_data, captured_at, frame);
+        frame is a private copy of the input frame when copy_frame is set, otherwise None.
+        """
+        if not self.pending:
+            raise RuntimeError("No frames in flight")
+        while self.emit_seq not in self.done:
+            self._receive(timeout)
+        error = self.done.pop(self.emit_seq)
+        slot, captured_at = self.pending.pop(self.emit_seq)
+        self.emit_seq += 1
+
+        rows = self.counts[slot].tolist() if error is None else [[0] * len(VEHICLE_CLASSES)] * len(self.keys)
+        traffic_data = {}
+        for (inter_no, road_no), row in zip(self.keys, rows):
+            traffic_data.setdefault(inter_no, {})[road_no] = dict(zip(VEHICLE_CLASSES, row))
+        frame = self.frames[slot].copy() if copy_frame else None
+        self.free.append(slot)
+        return traffic_data, captured_at, frame
+
+    def roi_inferences(self):
+        """Detector runs per valid ROI: every processed frame covers each of them once."""
+        processed = sum(self.processed)
+        return {key: processed for key in self.roi_keys}
+
+    def stats(self):
+        return {"workers": len(self.workers), "slots": self.num_slots, "in_flight": len(self.pending),
+                "processed_per_worker": list(self.processed), "errors": self.errors}
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for worker in self.workers:
+            if worker.is_alive():
+                self.tasks.put(None)
+        for worker in self.workers:
+            if worker.pid is not None:
+                worker.join(timeout=5.0)
+                if worker.is_alive():
+                    worker.terminate()
+        del self.frames, self.counts
+        self.frame_shm.close()
+        self.frame_shm.unlink()
+        self.count_shm.close()
+        self.count_shm.unlink()
@@ -1,88 +1,140 @@
+import startup_profile
+startup_profile.install()
+
 import cv2
 import json
 import time
 import datetime
 import asyncio
 import aiohttp
-import shutil
 from model import VehicleDetector
 from algorithm import optimize_intersections
-from utils import draw_roi, draw_detections, log_congestion
-from rl_agent import RLAgent
-from ml_predictor import MLModel
+from signal_controller import SignalController
+from utils import render_frame, draw_signals, PreviewWriter
+from congestion_log import CongestionLogWriter
+from roi_index import ROILayout, ROIIndex
+from capture import FrameCapture
+from cameras import compute_intersections_from_grid, build_roi_detector, detect_traffic, CameraCoordinator
+from detector_pool import DetectorPool
+from road_network import RoadNetwork
+from uplink import SignalUplink
+from control import ControlChannel
+from ml_predictor import GreenTimeObserver
+from model_loader import ModelLoader
+from metrics import Metrics, ProfileTrigger, MetricsServer
+
+# Longest wait for a frame or a detection result before the loop services control commands again.
+POLL_INTERVAL = 1.0
 
 def load_config(path="config.json"):
     with open(path, "r") as f:
         return json.load(f)
 
-def compute_intersections_from_grid(grid_config, frame_width, frame_height):
-    """
-    Computes intersection ROIs given grid parameters.
-    Each intersection has four road ROIs (north, south, east, west).
-    """
-    intersections = {}
-    rows = grid_config["rows"]
-    cols = grid_config["cols"]
-    roi_width = grid_config["roi_width"]
-    roi_height = grid_config["roi_height"]
-
-    cell_width = frame_width / cols
-    cell_height = frame_height / rows
-    inter_id = 1
-    for row in range(rows):
-        for col in range(cols):
-            base_x = col * cell_width
-            base_y = row * cell_height
-            intersections[str(inter_id)] = {
-                "roads": {
-                    "north": [int(base_x + cell_width/2 - roi_width/2), int(base_y + cell_height/4 - roi_height/2), roi_width, roi_height],
-                    "south": [int(base_x + cell_width/2 - roi_width/2), int(base_y + 3*cell_height/4 - roi_height/2), roi_width, roi_height],
-                    "east":  [int(base_x + 3*cell_width/4 - roi_width/2), int(base_y + cell_height/2 - roi_height/2), roi_width, roi_height],
-                    "west":  [int(base_x + cell_width/4 - roi_width/2), int(base_y + cell_height/2 - roi_height/2), roi_width, roi_height]
-                }
-            }
-            inter_id += 1
-    return intersections
-
-async def send_data(session, url, data):
-    try:
-        async with session.post(url + "traffic/signal-data", json={"data": data}, timeout=5) as response:
-            if response.status == 204:
-                print("Data sent successfully")
-            else:
-                print(f"Failed to send data. Status code: {response.status}")
-                print(f"Response text: {await response.text()}")
-    except aiohttp.ClientConnectorError as e:
-        print(f"Connection error: {e}")
-    except asyncio.TimeoutError:
-        print("Request timed out")
-    except Exception as e:
-        print(f"An error occurred while sending data: {e}")
+def register_collectors(metrics, capture, coordinator, detector_pool, roi_detector, roi_layout, uplink):
+    """Counters owned by the pipeline components, read when the metrics endpoint is scraped."""
+    def frames():
+        if coordinator is not None:
+            stats = {feed.name: feed.capture.stats() for feed in coordinator.feeds}
+        else:
+            stats = {"0": capture.stats()}
+        return {(("camera", name), ("state", state)): camera[f"{state}_frames"]
+                for name, camera in stats.items() for state in ("captured", "processed", "dropped")}
+    metrics.add_collector("frames_total", "counter", "Frames captured, processed and dropped per camera.", frames)
+
+    def roi_inferences():
+        if coordinator is not None:
+            counts = {}
+            for feed in coordinator.feeds:
+                counts.update(feed.roi_inferences())
+        elif detector_pool is not None:
+            counts = detector_pool.roi_inferences()
+        elif roi_detector is not None:
+            counts = roi_detector.roi_inferences()
+        else:
+            detected = metrics.stages["detect"].count if "detect" in metrics.stages else 0
+            counts = {key: detected for key in roi_layout.keys}
+        return {(("intersection", key[0]), ("road", key[1])) if isinstance(key, tuple) else (("roi", key),): value
+                for key, value in counts.items()}
+    metrics.add_collector("roi_inferences_total", "counter", "Detector runs per ROI.", roi_inferences)
+
+    def pool_frames():
+        if coordinator is not None:
+            pools = {feed.name: feed.pool for feed in coordinator.feeds if feed.pool is not None}
+        else:
+            pools = {"0": detector_pool} if detector_pool is not None else {}
+        return {(("camera", name), ("worker", str(i))): n
+                for name, pool in pools.items() for i, n in enumerate(pool.stats()["processed_per_worker"])}
+    metrics.add_collector("pool_frames_total", "counter", "Frames detected per pool worker.", pool_frames)
+    metrics.add_collector("uplink_total", "counter", "Signal uplink snapshots by outcome.",
+                          lambda: {(("outcome", key),): uplink.stats()[key] for key in ("submitted", "coalesced", "dropped", "sent", "failures")})
+    metrics.add_collector("uplink_queue_depth", "gauge", "Snapshots waiting to be sent.", lambda: uplink.stats()["queue_depth"])
 
 async def main():
     url = "https://api.ibreakstuff.upayan.dev/"
     config = load_config("config.json")
-    # video_path = "data/sample_video8.mp4"                         # Uncomment this line to use a video file
-    # cap = cv2.VideoCapture(video_path)                            # Uncomment this line to use a video file
-    cap = cv2.VideoCapture(1)  # using the default camera           # Comment this line to use a video file
-    cap.set(cv2.CAP_PROP_FOCUS, 60)                                 # Comment this line to use a video file
-    if not cap.isOpened():
-        print("Error: Could not open video.")
-        return
-
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-    if "grid" in config:
-        intersections_config = compute_intersections_from_grid(config["grid"], frame_width, frame_height)
+    # Detection runs at native capture resolution; scale_factor only enlarges the rendered view.
+    scale_factor = 1.5
+    # "roi" crops and detects every road separately; "full_frame" detects once and buckets boxes into roads.
+    detection_mode = config.get("detection_mode", "roi")
+    headless = config.get("headless", False)
+    # Dumping every tick's signals to stdout is costly on large networks; only done when verbose.
+    verbose = config.get("verbose", False)
+
+    # Per-stage latency histograms; served in Prometheus text format when metrics.port is set.
+    metrics_config = config.get("metrics", {})
+    metrics = Metrics(metrics_config.get("window", 1024))
+    profiler = ProfileTrigger(metrics_config.get("profile_dir", "profiles"))
+
+    # A "cameras" list runs one capture and detection pipeline per camera and merges them into
+    # one network-wide tick; otherwise the single camera below drives every intersection.
+    coordinator = None
+    cap = capture = detector_pool = roi_detector = roi_layout = None
+    if config.get("cameras"):
+        try:
+            coordinator = CameraCoordinator(config["cameras"], detection_mode,
+                                            config.get("camera_stale_after", 2.0), config.get("camera_max_age", 10.0),
+                                            keep_frames=not headless, detector_config=config.get("detector"),
+                                            metrics=metrics)
+        except (RuntimeError, ValueError) as e:
+            print(f"Error: {e}")
+            return
+        intersections_config = coordinator.intersections
     else:
-        intersections_config = config.get("intersections", {})
+        # video_path = "data/sample_video8.mp4"                         # Uncomment this line to use a video file
+        # cap = cv2.VideoCapture(video_path)                            # Uncomment this line to use a video file
+        cap = cv2.VideoCapture(1)  # using the default camera           # Comment this line to use a video file
+        cap.set(cv2.CAP_PROP_FOCUS, 60)                                 # Comment this line to use a video file
+        if not cap.isOpened():
+            print("Error: Could not open video.")
+            return
 
-    detector = VehicleDetector()
-    scale_factor = 1.5
-    min_phase_duration = config.get("min_phase_duration", 5)  # minimum wait of 5 sec
-    last_phase_state = {}
-    last_phase_switch_time = {}
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if "grid" in config:
+            intersections_config = compute_intersections_from_grid(config["grid"], frame_width, frame_height)
+        else:
+            intersections_config = config.get("intersections", {})
+
+        # With detector_workers > 0, detection runs in worker processes fed through a shared-memory frame ring.
+        detector_workers = config.get("detector_workers", 0)
+        if detector_workers > 0:
+            detector_pool = DetectorPool(intersections_config, frame_width, frame_height, detector_workers,
+                                         config.get("detector_ring_slots"), detection_mode, config.get("detector")).start()
+        else:
+            # ROI geometry is compiled once into slices; the detector gets zero-copy crops.
+            roi_layout = ROILayout(intersections_config, frame_width, frame_height)
+            # The "detector" block sets imgsz ("auto" fits it to the ROIs), conf, classes and a CPU export.
+            detector = VehicleDetector.from_config(config.get("detector"), roi_layout.sizes() if detection_mode == "roi" else None)
+            roi_index = ROIIndex(intersections_config, frame_width, frame_height) if detection_mode == "full_frame" else None
+            # Optional per-ROI scheduling: skip unchanged ROIs and/or track boxes between detections.
+            roi_detector = build_roi_detector(detector, config)
+
+    # Neighbour influence graph: the explicit adjacency block if present, otherwise the grid layout.
+    network = RoadNetwork.from_config(config, list(intersections_config.keys()))
+
+    # Per-intersection phase state machines (min green, yellow, all-red) driven by a timer heap.
+    signal_controller = SignalController.from_config(config)
     config["last_school_bus_green"] = config.get("last_school_bus_green", datetime.datetime.now())
 
     # Initialize prediction data for each intersection.
@@ -93,125 +145,219 @@ async def main():
             prediction_data[inter_no][road_no] = {"car": 0, "ambulance": 0, "schoolbus": 0, "accident": 0}
     alpha = config.get("prediction_alpha", 0.7)
 
-    # Instantiate and (optionally) train the DRL agent.
-    rl_agent = RLAgent()
-    if config.get("train_rl_agent", False):
-        print("Training DRL Agent ...")
-        rl_agent.train_agent(episodes=config.get("rl_training_episodes", 1000))
-        print("DRL Training complete.")
-
-    # Instantiate and train the ML predictor.
-    ml_model = MLModel()
-    ml_model.train_model()
+    # torch and sklearn are only imported once their mode is selected; persisted artifacts are
+    # loaded when compatible and models are trained (and persisted) only when none exist.
+    artifact_dir = config.get("artifact_dir", "models/artifacts")
+    models = ModelLoader(config, artifact_dir, config.get("retrain_models", False))
+    green_observer = GreenTimeObserver() if config.get("ml_online_learning") else None
 
     # Define available modes and set the initial mode.
     modes = ["normal", "ml", "rl"]
     operation_mode = config.get("operation_mode", "normal")
     mode_index = modes.index(operation_mode)
+    models.request(operation_mode, wait=True)
+    if green_observer is not None:
+        models.request("ml")
+
+    startup_profile.uninstall()
+    if config.get("startup_profile", False):
+        startup_profile.report()
+
+    # Headless runs skip every drawing call and the display window; an optional preview is rendered off the hot path.
+    preview = None
+    if headless and config.get("preview_path") and coordinator is None:
+        preview = PreviewWriter(intersections_config, scale_factor, config["preview_path"], config.get("preview_interval", 1.0))
+    control = await ControlChannel(config.get("control_port")).start()
+
+    # Served in Prometheus text format when metrics.port is set.
+    metrics_server = None
+    if metrics_config.get("port"):
+        metrics_server = await MetricsServer(metrics, profiler, metrics_config["port"], metrics_config.get("host", "127.0.0.1")).start()
+
+    # Congestion history is written by a background thread in a compact, rotating format.
+    log_config = config.get("congestion_log", {})
+    congestion_log = CongestionLogWriter(log_config.get("path", "congestion_log.csv"),
+                                         max_bytes=log_config.get("max_bytes", 50 * 1024 * 1024),
+                                         rotate_interval=log_config.get("rotate_interval", 24 * 3600),
+                                         backup_count=log_config.get("backup_count", 30))
+
+    if coordinator is not None:
+        coordinator.start()
+    else:
+        # Decode frames on a separate thread so slow inference never makes us work on stale frames.
+        capture = FrameCapture(cap, config.get("capture_queue_size", 2), config.get("capture_policy", "drop_oldest")).start()
 
     async with aiohttp.ClientSession() as session:
+        # Signal snapshots are coalesced per intersection and POSTed in batches off the frame loop.
+        uplink = SignalUplink(session, url,
+                              max_pending=config.get("uplink_max_pending", 1000),
+                              max_batch=config.get("uplink_max_batch", 500),
+                              flush_interval=config.get("uplink_flush_interval", 1.0)).start()
+        register_collectors(metrics, capture, coordinator, detector_pool, roi_detector, roi_layout, uplink)
         while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("End of video stream.")
-                break
-            frame = cv2.resize(frame, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_LINEAR)
-
-            # Gather traffic counts from each ROI.
-            traffic_data = {}
-            for inter_no, inter_data in intersections_config.items():
-                traffic_data[inter_no] = {}
-                for road_no, roi in inter_data.get("roads", {}).items():
-                    x, y, w, h = [int(coord * scale_factor) for coord in roi]
-                    if w <= 0 or h <= 0 or y < 0 or x < 0 or y+h > frame.shape[0] or x+w > frame.shape[1]:
-                        print(f"Skipping invalid ROI for Intersection {inter_no}, Road {road_no}")
-                        traffic_data[inter_no][road_no] = {"car": 0, "ambulance": 0, "schoolbus": 0, "accident": 0}
-                        continue
-                    roi_frame = frame[y:y+h, x:x+w]
-                    if roi_frame.size == 0:
-                        print(f"Empty ROI for Intersection {inter_no}, Road {road_no}")
-                        traffic_data[inter_no][road_no] = {"car": 0, "ambulance": 0, "schoolbus": 0, "accident": 0}
-                        continue
-                    detections = detector.detect_vehicles(roi_frame)
-                    counts = {"car": 0, "ambulance": 0, "schoolbus": 0, "accident": 0}
-                    for detection in detections:
-                        if detection['class'] in counts:
-                            counts[detection['class']] += 1
-                    traffic_data[inter_no][road_no] = counts
-                    draw_detections(roi_frame, detections)
-                    frame[y:y+h, x:x+w] = roi_frame
-
-                    # Update prediction data using an exponential moving average.
-                    prev_pred = prediction_data[inter_no][road_no]["car"]
-                    current_count = counts["car"]
-                    new_pred = alpha * current_count + (1 - alpha) * prev_pred
-                    prediction_data[inter_no][road_no]["car"] = new_pred
-
-            current_time = datetime.datetime.now()
-            # Call the optimization algorithm. Pass ml_model or rl_agent based on the current mode.
-            output_signals, computed_phases = optimize_intersections(
-                traffic_data, prediction_data, config, current_time,
-                rl_agent if operation_mode == "rl" else None,
-                ml_model if operation_mode == "ml" else None
-            )
-            current_time_sec = time.time()
-            final_phases = {}
-            for inter_no, new_phase in computed_phases.items():
-                if inter_no not in last_phase_state:
-                    last_phase_state[inter_no] = new_phase
-                    last_phase_switch_time[inter_no] = current_time_sec
-                    final_phases[inter_no] = new_phase
+            tick_start = t = time.perf_counter()
+            camera_frames = {}
+            if coordinator is not None:
+                # Merge the latest counts of every camera; a lagging feed never holds up the tick.
+                traffic_data, captured_at, camera_frames = coordinator.next_tick()
+                if traffic_data is None:
+                    print("All camera feeds ended.")
+                    break
+                # With nothing new only the display and control commands are serviced this tick.
+                frame = None
+                t = metrics.lap("capture", t)
+            elif detector_pool is not None:
+                # Hand every frame captured so far to a free ring slot; wait for a frame only when the pool is idle.
+                while detector_pool.free_slots():
+                    ret, frame, frame_captured_at = capture.read(timeout=0 if detector_pool.in_flight() else POLL_INTERVAL)
+                    if not ret:
+                        break
+                    detector_pool.submit(frame, frame_captured_at)
+                if not detector_pool.in_flight() and capture.exhausted():
+                    print("End of video stream.")
+                    break
+                traffic_data, frame = {}, None
+                if detector_pool.in_flight() and detector_pool.ready(POLL_INTERVAL):
+                    t = metrics.lap("capture", t)
+                    traffic_data, captured_at, frame = detector_pool.next_result(copy_frame=not headless or preview is not None)
+                    t = metrics.lap("detect", t)
+            else:
+                ret, frame, captured_at = capture.read(timeout=POLL_INTERVAL)
+                if not ret and capture.exhausted():
+                    print("End of video stream.")
+                    break
+                traffic_data = {}
+                if ret:
+                    t = metrics.lap("capture", t)
+                    traffic_data = detect_traffic(detector, frame, roi_layout, roi_index, not headless, roi_detector)
+                    t = metrics.lap("detect", t)
+
+            if traffic_data:
+                # Update prediction data using an exponential moving average.
+                for inter_no, roads in traffic_data.items():
+                    for road_no, counts in roads.items():
+                        prev_pred = prediction_data[inter_no][road_no]["car"]
+                        current_count = counts["car"]
+                        new_pred = alpha * current_count + (1 - alpha) * prev_pred
+                        prediction_data[inter_no][road_no]["car"] = new_pred
+                t = metrics.lap("predict", t)
+
+                current_time = datetime.datetime.now()
+                # Call the optimization algorithm. Pass ml_model or rl_agent based on the current mode.
+                # Until a newly selected mode has loaded in the background, its model is None
+                # and the optimizer keeps using reactive timing.
+                output_signals, final_phases = optimize_intersections(
+                    traffic_data, prediction_data, config, current_time,
+                    models.get("rl") if operation_mode == "rl" else None,
+                    models.get("ml") if operation_mode == "ml" else None,
+                    network, signal_controller
+                )
+                t = metrics.lap("optimize", t)
+                if coordinator is not None:
+                    coordinator.record_decision()
                 else:
-                    prev_phase = last_phase_state[inter_no]
-                    if new_phase != prev_phase:
-                        if current_time_sec - last_phase_switch_time[inter_no] >= min_phase_duration:
-                            last_phase_state[inter_no] = new_phase
-                            last_phase_switch_time[inter_no] = current_time_sec
-                            final_phases[inter_no] = new_phase
-                        else:
-                            final_phases[inter_no] = prev_phase
-                    else:
-                        final_phases[inter_no] = prev_phase
-
-            # Append the current mode to each output.
-            for signal in output_signals:
-                signal["mode"] = ( "DRL Optimized" if operation_mode == "rl"
-                                   else ("ML Predictive" if operation_mode == "ml" else "Normal") )
-
-            # Log congestion history every cycle.
-            log_congestion(traffic_data, current_time)
-            print(json.dumps(output_signals, indent=2))
-            asyncio.create_task(send_data(session, url, output_signals))
-
-            for inter_no, inter_data in intersections_config.items():
-                for road_no, roi in inter_data.get("roads", {}).items():
-                    x, y, w, h = [int(coord * scale_factor) for coord in roi]
-                    decision = next((item for item in output_signals if item["intersection"] == inter_no and item["road"] == road_no), None)
-                    signal = decision["signal"] if decision else "UNKNOWN"
-                    dynamic_duration = decision.get("dynamic_green_duration") if decision else None
-                    counts = traffic_data[inter_no].get(road_no, {"car": 0, "ambulance": 0, "schoolbus": 0, "accident": 0})
-                    mode = decision.get("mode", "Normal") if decision else "Normal"
-                    draw_roi(frame, (x, y, w, h), inter_no, road_no, counts, signal, dynamic_duration, mode)
-
-            cv2.imshow("Intelligent Traffic Management System", frame)
-            key = cv2.waitKey(30) & 0xFF
-            if key == ord('q'):
+                    capture.record_decision(captured_at)
+                current_time_sec = current_time.timestamp()
+                ml_model = models.get("ml")
+                if green_observer is not None and ml_model is not None:
+                    for inter_no, count, start_time, green in green_observer.observe(traffic_data, final_phases, current_time_sec, current_time):
+                        ml_model.partial_fit(count, start_time, green, inter_no)
+                t = metrics.lap("phase", t)
+
+                # Append the current mode to each output.
+                for signal in output_signals:
+                    signal["mode"] = ( "DRL Optimized" if operation_mode == "rl"
+                                       else ("ML Predictive" if operation_mode == "ml" else "Normal") )
+
+                # Log congestion history every cycle.
+                congestion_log.log(traffic_data, current_time)
+                t = metrics.lap("log", t)
+                if verbose:
+                    print(json.dumps(output_signals, indent=2))
+                t = metrics.lap("output", t)
+                uplink.submit(output_signals)
+                t = metrics.lap("uplink", t)
+
+            if headless:
+                if preview is not None and frame is not None:
+                    preview.submit(frame, traffic_data, output_signals)
+            else:
+                if coordinator is not None:
+                    for name, (camera_frame, camera_intersections) in camera_frames.items():
+                        camera_frame = render_frame(camera_frame, scale_factor)
+                        draw_signals(camera_frame, camera_intersections, scale_factor, traffic_data, output_signals)
+                        cv2.imshow(f"Intelligent Traffic Management System - {name}", camera_frame)
+                elif frame is not None:
+                    display = render_frame(frame, scale_factor)
+                    draw_signals(display, intersections_config, scale_factor, traffic_data, output_signals)
+                    cv2.imshow("Intelligent Traffic Management System", display)
+                key = cv2.waitKey(30) & 0xFF
+                if key == ord('q'):
+                    control.push("quit")
+                # Press 't' to cycle through the modes.
+                if key == ord('t'):
+                    control.push("next")
+            t = metrics.lap("render", t)
+
+            stop_requested = False
+            for command in control.drain():
+                if command == "quit":
+                    stop_requested = True
+                elif command == "next":
+                    mode_index = (mode_index + 1) % len(modes)
+                elif command.startswith("mode ") and command[5:] in modes:
+                    mode_index = modes.index(command[5:])
+                elif command.startswith("profile"):
+                    seconds = command[8:].strip()
+                    if profiler.start(float(seconds) if seconds.replace(".", "", 1).isdigit() else 10.0):
+                        print("Profiling the main loop ...")
+                    continue
+                else:
+                    print(f"Ignoring control command: {command}")
+                    continue
+                if modes[mode_index] != operation_mode:
+                    operation_mode = modes[mode_index]
+                    models.request(operation_mode)
+                    config["operation_mode"] = operation_mode  # update config for consistency
+                    print(f"Operation Mode switched to {operation_mode}")
+            profiler.poll()
+            metrics.lap("control", t)
+            if traffic_data:
+                metrics.observe("tick", time.perf_counter() - tick_start)
+            if stop_requested:
                 break
-            # Press 't' to cycle through the modes.
-            if key == ord('t'):
-                mode_index = (mode_index + 1) % len(modes)
-                operation_mode = modes[mode_index]
-                config["operation_mode"] = operation_mode  # update config for consistency
-                print(f"Operation Mode switched to {operation_mode}")
             await asyncio.sleep(0)
 
-        # At session end, save a copy of the congestion log.
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        shutil.copy("congestion_log.txt", f"session_log_{timestamp}.txt")
-        print(f"Session log saved as session_log_{timestamp}.txt")
+        # At session end, rotate the congestion log so the session is kept as its own file.
+        session_log = congestion_log.close(rotate=True)
+        if green_observer is not None and models.get("ml") is not None:
+            models.get("ml").save(artifact_dir)
+        if session_log:
+            print(f"Session log saved as {session_log}")
+        await uplink.close()
+        print(f"Uplink stats: {uplink.stats()}")
+    print(f"Stage latency: {json.dumps(metrics.summary())}")
+    if metrics_server is not None:
+        await metrics_server.close()
+    await control.close()
     await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()})
-    cap.release()
-    cv2.destroyAllWindows()
+    if coordinator is not None:
+        coordinator.stop()
+        print(f"Camera stats: {coordinator.stats()}")
+    else:
+        capture.stop()
+        print(f"Capture stats: {capture.stats()}")
+        cap.release()
+    if roi_detector is not None:
+        print(f"ROI detector stats: {roi_detector.stats()}")
+    if detector_pool is not None:
+        print(f"Detector pool stats: {detector_pool.stats()}")
+        detector_pool.close()
+    models.close()
+    if preview is not None:
+        preview.stop()
+    if not headless:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,171 @@
+import cProfile
+import datetime
+import os
+import threading
+import time
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Latency samples of the last `window` observations plus lifetime count and sum."""
+    def __init__(self, window=1024):
+        self.values = np.zeros(window)
+        self.window = window
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.values[self.count % self.window] = seconds
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self.count:
+            return [0.0] * len(quantiles)
+        return np.quantile(self.values[:min(self.count, self.window)], quantiles).tolist()
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and counters of the main loop, rendered in the Prometheus text
+    format. Stages are timed with lap(), which costs one perf_counter call and one array store:
+
+        t = time.perf_counter()
+        ...capture...
+        t = metrics.lap("capture", t)
+
+    Counters held by other components (capture, uplink, detectors) are pulled at scrape time
+    through collectors, so the hot path never updates them twice. observe() may also be called
+    from camera feed threads.
+    """
+    def __init__(self, window=1024, prefix="traffic"):
+        self.window = window
+        self.prefix = prefix
+        self.stages = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def lap(self, stage, start):
+        now = time.perf_counter()
+        self.observe(stage, now - start)
+        return now
+
+    def add_collector(self, name, kind, help_text, collect):
+        """`collect()` returns {((label, value), ...): metric_value}, or a plain number for an unlabelled metric."""
+        self.collectors.append((name, kind, help_text, collect))
+
+    def summary(self):
+        return {stage: {"count": h.count, **{f"p{int(q * 100)}_ms": round(v * 1000, 2)
+                                            for q, v in zip(QUANTILES, h.quantiles())}}
+                for stage, h in list(self.stages.items())}
+
+    def render(self):
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Main loop stage latency over the last {self.window} observations.",
+                 f"# TYPE {name} summary"]
+        for stage, histogram in list(self.stages.items()):
+            for q, value in zip(QUANTILES, histogram.quantiles()):
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        for metric, kind, help_text, collect in self.collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Metrics collector {metric} failed: {e}")
+                continue
+            metric = f"{self.prefix}_{metric}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            if not isinstance(values, dict):
+                values = {None: values}
+            for labels, value in values.items():
+                label_text = ""
+                if labels:
+                    label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+                lines.append(f"{metric}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfileTrigger:
+    """
+    Runs cProfile over the main loop for a limited time and dumps the stats to `directory`.
+    start() is called from the metrics endpoint or a control command; the main loop calls poll()
+    once per tick, which stops the profiler after the deadline and writes a .prof file.
+    """
+    def __init__(self, directory="profiles"):
+        self.directory = directory
+        self.profiler = None
+        self.deadline = 0.0
+        self.last_path = None
+
+    def start(self, seconds=10.0):
+        if self.profiler is not None:
+            return False
+        self.profiler = cProfile.Profile()
+        self.deadline = time.monotonic() + seconds
+        self.profiler.enable()
+        return True
+
+    def poll(self):
+        if self.profiler is None or time.monotonic() < self.deadline:
+            return None
+        self.profiler.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, datetime.datetime.now().strftime("main_loop_%Y%m%d_%H%M%S.prof"))
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        self.last_path = path
+        print(f"Profile written to {path}")
+        return path
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint on the main event loop: GET /metrics returns the Prometheus text and
+    GET /profile?seconds=N starts a cProfile capture of the main loop.
+    """
+    def __init__(self, metrics, profiler, port=9100, host="127.0.0.1"):
+        self.metrics = metrics
+        self.profiler = profiler
+        self.port = port
+        self.host = host
+        self.runner = None
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        app.router.add_get("/profile", self._profile)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+        return self
+
+    async def _metrics(self, request):
+        from aiohttp import web
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def _profile(self, request):
+        from aiohttp import web
+        try:
+            seconds = float(request.query.get("seconds", 10))
+        except ValueError:
+            return web.Response(status=400, text="seconds must be a number\n")
+        if not self.profiler.start(seconds):
+            return web.Response(status=409, text="profile already running\n")
+        return web.Response(text=f"profiling the main loop for {seconds:g}s; stats go to {self.profiler.directory}/\n")
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
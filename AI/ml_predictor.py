@@ -1,11 +1,76 @@
+import itertools
+import json
 import numpy as np
-from sklearn.linear_model import LinearRegression
 import datetime
+from artifacts import save_artifact, load_artifact, DEFAULT_ARTIFACT_DIR
+
+class RecursiveLeastSquares:
+    """
+    Recursive least squares over features [effective_count, hour, 1].
+    Each update costs O(features^2); `forgetting` < 1 slowly discounts old observations
+    so the coefficients follow drifting traffic patterns.
+    """
+    def __init__(self, theta, forgetting=0.999, delta=1.0):
+        self.theta = np.array(theta, dtype=np.float64)
+        self.P = np.eye(len(self.theta)) * delta
+        self.forgetting = forgetting
+        self.samples = 0
+
+    def update(self, x, y):
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.theta += gain * (y - x @ self.theta)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        self.samples += 1
+
+class GreenTimeObserver:
+    """
+    Derives green-time training samples from the live stream: when a phase starts, the cars
+    waiting on its approaches are noted, and the time until they are cleared becomes the
+    observed green time for that count. Phases that end before clearing yield no sample, and
+    gaps in the stream longer than `max_gap` seconds (restarts, dropped feeds) reset tracking.
+    """
+    phase_roads = {"A": ("north", "south"), "B": ("east", "west")}
+
+    def __init__(self, max_gap=10.0, max_green=120.0):
+        self.max_gap = max_gap
+        self.max_green = max_green
+        self.active = {}
+        self.last_seen = None
+
+    def observe(self, traffic_data, phases, now, current_time):
+        """Returns (intersection, waiting_cars, phase_start_time, observed_green) samples."""
+        if self.last_seen is not None and now - self.last_seen > self.max_gap:
+            self.active = {}
+        self.last_seen = now
+        samples = []
+        for inter_no, phase in phases.items():
+            roads = self.phase_roads.get(phase)
+            if roads is None:
+                self.active.pop(inter_no, None)
+                continue
+            served = sum(traffic_data.get(inter_no, {}).get(r, {}).get("car", 0) for r in roads)
+            active = self.active.get(inter_no)
+            if active is None or active[0] != phase:
+                self.active[inter_no] = (phase, now, served, current_time)
+            elif served == 0 and active[2] > 0:
+                if now - active[1] <= self.max_green:
+                    samples.append((inter_no, active[2], active[3], now - active[1]))
+                self.active[inter_no] = (phase, now, 0, current_time)
+        return samples
 
 class MLModel:
+    artifact_name = "ml_model"
+    artifact_version = 2
+    features = ["effective_count", "hour"]
+
     def __init__(self):
+        # Imported here so that modules which only need GreenTimeObserver do not load sklearn.
+        from sklearn.linear_model import LinearRegression
         self.model = LinearRegression()
         self.trained = False
+        self.online = None
+        self.learners = {}
 
     def train_model(self):
         # Simulate historical data.
@@ -30,3 +95,130 @@ class MLModel:
         prediction = self.model.predict(X_new)[0]
         prediction = max(10, min(120, prediction))
         return prediction
+
+    def predict_batch(self, effective_counts, current_time, ids=None):
+        """
+        Optimal green times for a whole tick at once. Evaluates the fitted linear model
+        directly (no per-call sklearn validation) and computes the hour feature once.
+        With online learning, the learned coefficients (per intersection when `ids` is given)
+        replace the fitted ones.
+        """
+        if not self.trained:
+            self.train_model()
+        hour = current_time.hour + current_time.minute / 60.0
+        counts = np.asarray(effective_counts, dtype=np.float64)
+        if self.learners:
+            bucket = self._bucket(hour)
+            shared = self.learners.get((None, bucket))
+            theta = shared.theta if shared is not None else self._fitted_theta()
+            if ids is not None and self.online["per_intersection"]:
+                thetas = np.array([self.learners[(inter_no, bucket)].theta if (inter_no, bucket) in self.learners
+                                   else theta for inter_no in ids]).reshape(-1, 3)
+                predictions = counts * thetas[:, 0] + hour * thetas[:, 1] + thetas[:, 2]
+            else:
+                predictions = counts * theta[0] + hour * theta[1] + theta[2]
+            return np.clip(predictions, 10, 120)
+        coef = self.model.coef_
+        base = self.model.intercept_ + coef[1] * hour
+        predictions = counts * coef[0] + base
+        return np.clip(predictions, 10, 120)
+
+    def enable_online(self, per_intersection=False, hour_buckets=0, forgetting=0.999, delta=1.0):
+        """
+        Turns on streaming updates through partial_fit. Optional per-intersection models and
+        hour-of-day buckets each get their own RLS learner, seeded from the fitted coefficients.
+        """
+        online = {"per_intersection": per_intersection, "hour_buckets": hour_buckets,
+                  "forgetting": forgetting, "delta": delta}
+        if online != self.online:
+            self.learners = {}
+        self.online = online
+
+    def _fitted_theta(self):
+        if not self.trained:
+            self.train_model()
+        return np.array([self.model.coef_[0], self.model.coef_[1], self.model.intercept_])
+
+    def _bucket(self, hour):
+        buckets = self.online["hour_buckets"]
+        return min(int(hour * buckets / 24), buckets - 1) if buckets else None
+
+    def _learner(self, key):
+        learner = self.learners.get(key)
+        if learner is None:
+            shared = self.learners.get((None, key[1]))
+            theta = shared.theta if shared is not None else self._fitted_theta()
+            learner = RecursiveLeastSquares(theta, self.online["forgetting"], self.online["delta"])
+            self.learners[key] = learner
+        return learner
+
+    def partial_fit(self, effective_count, current_time, observed_green, inter_no=None):
+        """
+        One O(features^2) update from an observed green time. Online learning is enabled with
+        the default settings if enable_online was not called first.
+        """
+        if self.online is None:
+            self.enable_online()
+        hour = current_time.hour + current_time.minute / 60.0
+        x = np.array([effective_count, hour, 1.0])
+        bucket = self._bucket(hour)
+        self._learner((None, bucket)).update(x, observed_green)
+        if self.online["per_intersection"] and inter_no is not None:
+            self._learner((inter_no, bucket)).update(x, observed_green)
+
+    def warm_start(self, paths, config, max_ticks=100000):
+        """
+        Streams historical congestion logs through the controller and feeds the observed green
+        times to partial_fit. Memory stays bounded by the number of intersections.
+        """
+        from congestion_log import read_congestion_log
+        from replay import replay_ticks
+        observer = GreenTimeObserver()
+        current = {}
+
+        def ticks():
+            for timestamp, traffic_data in itertools.islice(read_congestion_log(paths), max_ticks):
+                current["tick"] = (timestamp, traffic_data)
+                yield timestamp, traffic_data
+
+        samples = 0
+        for records in replay_ticks(ticks(), dict(config, operation_mode="normal")):
+            timestamp, traffic_data = current["tick"]
+            phases = {record["intersection"]: record["phase"] for record in records}
+            for inter_no, count, start_time, green in observer.observe(traffic_data, phases, timestamp.timestamp(), timestamp):
+                self.partial_fit(count, start_time, green, inter_no)
+                samples += 1
+        return samples
+
+    def save(self, directory=DEFAULT_ARTIFACT_DIR):
+        """Persists the fitted coefficients, plus any online learners, as a checksummed artifact."""
+        if not self.trained:
+            self.train_model()
+        fitted = {"coef": self.model.coef_.tolist(), "intercept": float(self.model.intercept_)}
+        if self.online is not None:
+            fitted["online"] = self.online
+            fitted["learners"] = [{"intersection": key[0], "bucket": key[1], "theta": learner.theta.tolist(),
+                                   "P": learner.P.tolist(), "samples": learner.samples}
+                                  for key, learner in self.learners.items()]
+        payload = json.dumps(fitted).encode()
+        return save_artifact(directory, self.artifact_name, payload, self.artifact_version, {"features": self.features})
+
+    def load(self, directory=DEFAULT_ARTIFACT_DIR):
+        """Restores fitted coefficients; returns False when no compatible artifact exists."""
+        payload = load_artifact(directory, self.artifact_name, self.artifact_version, {"features": self.features})
+        if payload is None:
+            return False
+        fitted = json.loads(payload)
+        self.model.coef_ = np.array(fitted["coef"], dtype=np.float64)
+        self.model.intercept_ = float(fitted["intercept"])
+        self.model.n_features_in_ = len(self.features)
+        self.trained = True
+        if "online" in fitted:
+            self.online = fitted["online"]
+            self.learners = {}
+            for entry in fitted["learners"]:
+                learner = RecursiveLeastSquares(entry["theta"], self.online["forgetting"])
+                learner.P = np.array(entry["P"])
+                learner.samples = entry["samples"]
+                self.learners[(entry["intersection"], entry["bucket"])] = learner
+        return True
@@ -1,26 +1,129 @@
 import cv2
 import os
-from ultralytics import YOLO
+import shutil
+import numpy as np
 import random
+from traffic_state import VEHICLE_CLASSES
 
 class VehicleDetector:
-    def __init__(self, model_path='models/best.pt'):
+    class_names = {0: 'accident', 1: 'ambulance', 2: 'car', 3: 'schoolbus'}
+    # Model class id -> index into VEHICLE_CLASSES, so array results can be counted with bincount.
+    vehicle_index = np.array([VEHICLE_CLASSES.index(name) for _, name in sorted(class_names.items())], dtype=np.int64)
+
+    def __init__(self, model_path='models/best.pt', imgsz=None, conf=0.7, classes=None, export=None):
+        """
+        imgsz: inference size (None keeps the model's default); match it to the ROI size so small
+        crops are not letterboxed up to the full training resolution.
+        conf / classes: confidence threshold and class names, applied inside the inference call.
+        export: optional {"format": "onnx" | "openvino", "half": bool, "int8": bool}; the model is
+        exported once for CPU inference at this imgsz and the export is reused on later runs.
+        """
+        # Imported here so that importing this module (main, the pool's coordinator) does not load torch.
+        from ultralytics import YOLO
         self.model_path = os.path.join(os.getcwd(), model_path)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.classes = None
+        if classes is not None:
+            ids = {name: i for i, name in self.class_names.items()}
+            self.classes = [ids[name] for name in classes if name in ids]
         self.model = YOLO(self.model_path)
+        if export:
+            self.model = YOLO(self._export(export), task="detect")
+
+    @staticmethod
+    def imgsz_for(roi_sizes, stride=32, minimum=64, maximum=640):
+        """Smallest stride multiple that holds the largest ROI side, clamped to [minimum, maximum]."""
+        largest = max([max(w, h) for w, h in roi_sizes] or [maximum])
+        return int(min(maximum, max(minimum, -(-largest // stride) * stride)))
+
+    def _export(self, export):
+        fmt = export.get("format", "onnx")
+        # ultralytics silently drops these, which would leave a file named after a precision it lacks.
+        if fmt == "onnx" and export.get("int8"):
+            raise ValueError("int8 export is only supported with format 'openvino'")
+        if fmt == "onnx" and export.get("half") and str(export.get("device", "cpu")) == "cpu":
+            raise ValueError("half-precision ONNX export needs a CUDA export device (detector.export.device)")
+        precision = "_int8" if export.get("int8") else ("_half" if export.get("half") else "")
+        stem, _ = os.path.splitext(self.model_path)
+        target = f"{stem}_{self.imgsz or 'default'}{precision}" + (".onnx" if fmt == "onnx" else "_openvino_model")
+        # Reuse the export only while it is newer than the weights it was made from.
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(self.model_path):
+            return target
+        print(f"Exporting {self.model_path} to {fmt} ...")
+        kwargs = {"format": fmt, "dynamic": True, "half": export.get("half", False), "int8": export.get("int8", False)}
+        if self.imgsz:
+            kwargs["imgsz"] = self.imgsz
+        if export.get("device") is not None:
+            kwargs["device"] = export["device"]
+        if export.get("data"):
+            kwargs["data"] = export["data"]  # INT8 calibration images
+        exported = str(self.model.export(**kwargs)).rstrip(os.sep)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(exported, target)
+        return target
+
+    @classmethod
+    def from_config(cls, detector_config=None, roi_sizes=None):
+        """Builds a detector from the "detector" config block; imgsz "auto" sizes it to `roi_sizes`."""
+        detector_config = dict(detector_config or {})
+        if detector_config.get("imgsz") == "auto":
+            detector_config["imgsz"] = cls.imgsz_for(roi_sizes) if roi_sizes else None
+        return cls(**detector_config)
+
+    def _predict(self, source):
+        kwargs = {"imgsz": self.imgsz} if self.imgsz else {}
+        return self.model(source, conf=self.conf, classes=self.classes, verbose=False, **kwargs)
+
+    @staticmethod
+    def _arrays(result):
+        boxes = result.boxes
+        return (boxes.xyxy.cpu().numpy().astype(np.int32),
+                boxes.conf.cpu().numpy().astype(np.float32),
+                boxes.cls.cpu().numpy().astype(np.int64))
+
+    def _parse_result(self, result):
+        detections = []
+        xyxy, confidences, class_ids = self._arrays(result)
+        for (x1, y1, x2, y2), conf, cls in zip(xyxy.tolist(), confidences.tolist(), class_ids.tolist()):
+            class_name = self.class_names.get(cls, 'unknown')
+            detection = {'bbox': (x1, y1, x2, y2), 'confidence': conf, 'class': class_name}
+            if class_name == "ambulance":
+                detection["speed"] = random.uniform(40, 80)
+            detections.append(detection)
+        return detections
+
     def detect_vehicles(self, frame):
-        results = self.model(frame)
+        results = self._predict(frame)
         detections = []
         for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                conf = float(box.conf[0])
-                cls = int(box.cls[0])
-                class_names = {0: 'accident', 1: 'ambulance', 2: 'car', 3: 'schoolbus'}
-                class_name = class_names.get(cls, 'unknown')
-                if conf < 0.7:
-                    continue
-                detection = {'bbox': (x1, y1, x2, y2), 'confidence': conf, 'class': class_name}
-                if class_name == "ambulance":
-                    detection["speed"] = random.uniform(40, 80)
-                detections.append(detection)
+            detections.extend(self._parse_result(result))
         return detections
+
+    def detect_batch(self, frames):
+        """
+        Runs every ROI crop of a frame through the model in one batched forward pass.
+        Returns one detection list per crop, in the same order as `frames`.
+        """
+        if not frames:
+            return []
+        results = self._predict(list(frames))
+        return [self._parse_result(result) for result in results]
+
+    def detect_arrays(self, frames):
+        """
+        Batched detection without per-box dicts: one (boxes (N, 4) int32 xyxy, confidences (N,),
+        classes (N,)) tuple per frame, with classes as VEHICLE_CLASSES indices.
+        """
+        if not frames:
+            return []
+        results = []
+        for result in self._predict(list(frames)):
+            xyxy, confidences, class_ids = self._arrays(result)
+            # Classes the counter does not know (the dict path labels them 'unknown') are dropped.
+            known = class_ids < len(self.vehicle_index)
+            if not known.all():
+                xyxy, confidences, class_ids = xyxy[known], confidences[known], class_ids[known]
+            results.append((xyxy, confidences, self.vehicle_index[class_ids]))
+        return results
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from startup_profile import rss_mb, record
+
+
+class ModelLoader:
+    """
+    Builds the controller for each operation mode on first use, so torch and sklearn are only
+    imported once "rl" or "ml" is actually selected. Requests made while frames are flowing
+    load on a background thread; get() returns None until the model is ready, and the
+    optimizer falls back to reactive timing in the meantime.
+    """
+    def __init__(self, config, artifact_dir="models/artifacts", retrain=False):
+        self.config = config
+        self.artifact_dir = artifact_dir
+        self.retrain = retrain
+        self.models = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+    def _load_rl(self):
+        # Serve an exported frozen policy when configured, otherwise the full DRL agent.
+        if self.config.get("rl_policy_path"):
+            from rl_policy import FrozenPolicy
+            return FrozenPolicy(self.config["rl_policy_path"])
+        from rl_agent import RLAgent
+        rl_agent = RLAgent()
+        if not self.retrain and rl_agent.load(self.artifact_dir):
+            print("Loaded DRL Agent from artifacts.")
+        elif self.config.get("train_rl_agent", False):
+            print("Training DRL Agent ...")
+            rl_agent.train_agent(episodes=self.config.get("rl_training_episodes", 1000),
+                                 updates_per_step=self.config.get("rl_updates_per_step"))
+            rl_agent.save(self.artifact_dir)
+            print("DRL Training complete.")
+        return rl_agent
+
+    def _load_ml(self):
+        from ml_predictor import MLModel
+        ml_model = MLModel()
+        if not self.retrain and ml_model.load(self.artifact_dir):
+            print("Loaded ML predictor from artifacts.")
+        else:
+            ml_model.train_model()
+            ml_model.save(self.artifact_dir)
+
+        # Optional streaming updates of the ML predictor from what the cameras actually see.
+        # Either `true` for the defaults or a block of settings.
+        online = self.config.get("ml_online_learning")
+        online_config = online if isinstance(online, dict) else {}
+        if online:
+            ml_model.enable_online(online_config.get("per_intersection", False), online_config.get("hour_buckets", 0),
+                                   online_config.get("forgetting", 0.999))
+            if not ml_model.learners and online_config.get("warm_start_logs"):
+                samples = ml_model.warm_start(online_config["warm_start_logs"], self.config,
+                                              online_config.get("warm_start_max_ticks", 100000))
+                print(f"ML predictor warm-started from {samples} historical samples.")
+        return ml_model
+
+    def _load(self, mode):
+        start, rss = time.perf_counter(), rss_mb()
+        try:
+            model = self._load_rl() if mode == "rl" else self._load_ml()
+        except Exception as e:
+            print(f"Failed to load {mode} mode: {e}")
+            with self.lock:
+                self.pending.pop(mode, None)
+            raise
+        seconds, rss_delta = time.perf_counter() - start, rss_mb() - rss
+        record(f"load {mode} mode", seconds, rss_delta)
+        print(f"Loaded {mode} mode in {seconds:.2f}s ({rss_delta:+.1f} MB RSS)")
+        with self.lock:
+            self.models[mode] = model
+            self.pending.pop(mode, None)
+        return model
+
+    def request(self, mode, wait=False):
+        """Starts loading `mode` if needed; with wait=True blocks until it is ready."""
+        if mode not in ("rl", "ml"):
+            return None
+        with self.lock:
+            if mode in self.models:
+                return self.models[mode]
+            future = self.pending.get(mode)
+            if future is None:
+                future = self.pending[mode] = self.executor.submit(self._load, mode)
+        return future.result() if wait else None
+
+    def get(self, mode):
+        return self.models.get(mode)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,105 @@
+import time
+import cv2
+import numpy as np
+
+
+class ROICache:
+    """Last detections of one ROI and the thumbnail they were computed from."""
+    def __init__(self):
+        self.reference = None
+        self.detections = None
+        self.detected_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+
+class MotionGate:
+    """
+    Skips detection on ROIs that have not changed since they were last detected.
+    Each crop is reduced to a grey thumbnail (`downsample` pixels per cell, area-averaged so
+    sensor noise cancels out) with its mean brightness removed, so exposure drift is ignored.
+    When less than `threshold` of the cells differ from the thumbnail of the last detection by
+    more than `pixel_delta`, the cached detections are reused, at most `max_age` seconds long.
+    Wraps a detector (or an AdaptiveDetector) and exposes the same keyed detect_batch.
+    """
+    keyed = True
+
+    def __init__(self, detector, threshold=0.02, pixel_delta=15, downsample=8, max_age=5.0):
+        self.detector = detector
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.downsample = downsample
+        self.max_age = max_age
+        self.rois = {}
+        self.forced = 0
+
+    @classmethod
+    def from_config(cls, detector, gate_config):
+        return cls(detector, **{k: v for k, v in gate_config.items() if k != "enabled"})
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        size = (max(1, gray.shape[1] // self.downsample), max(1, gray.shape[0] // self.downsample))
+        thumb = cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+        return thumb - int(thumb.mean())
+
+    def changed(self, reference, thumb):
+        """Fraction of thumbnail cells that moved by more than pixel_delta."""
+        if reference is None or reference.shape != thumb.shape:
+            return 1.0
+        return float(np.count_nonzero(np.abs(thumb - reference) > self.pixel_delta)) / thumb.size
+
+    def detect_batch(self, frames, keys):
+        now = time.monotonic()
+        results = [None] * len(frames)
+        due, thumbs = [], {}
+        for i, (key, frame) in enumerate(zip(keys, frames)):
+            cache = self.rois.get(key)
+            if cache is None:
+                cache = self.rois[key] = ROICache()
+            thumb = self._thumbnail(frame)
+            if cache.detections is not None and self.changed(cache.reference, thumb) < self.threshold:
+                if now - cache.detected_at <= self.max_age:
+                    cache.hits += 1
+                    results[i] = cache.detections
+                    continue
+                self.forced += 1
+            cache.misses += 1
+            thumbs[i] = thumb
+            due.append(i)
+
+        if due:
+            frames_due = [frames[i] for i in due]
+            if getattr(self.detector, "keyed", False):
+                fresh = self.detector.detect_batch(frames_due, [keys[i] for i in due])
+            else:
+                fresh = self.detector.detect_batch(frames_due)
+            for i, detections in zip(due, fresh):
+                cache = self.rois[keys[i]]
+                cache.reference = thumbs[i]
+                cache.detections = detections
+                cache.detected_at = now
+                results[i] = detections
+        return results
+
+    def roi_inferences(self):
+        """Detector runs per ROI key (cache misses, or the wrapped tracker's own schedule)."""
+        if hasattr(self.detector, "roi_inferences"):
+            return self.detector.roi_inferences()
+        return {key: cache.misses for key, cache in self.rois.items()}
+
+    def stats(self):
+        hits = sum(cache.hits for cache in self.rois.values())
+        lookups = hits + sum(cache.misses for cache in self.rois.values())
+        stats = {
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "hits": hits,
+            "lookups": lookups,
+            "stale_refreshes": self.forced,
+            "roi_hit_rates": {"/".join(map(str, key)) if isinstance(key, tuple) else str(key):
+                              round(cache.hits / (cache.hits + cache.misses), 3)
+                              for key, cache in self.rois.items() if cache.hits + cache.misses},
+        }
+        if hasattr(self.detector, "stats"):
+            stats["detector"] = self.detector.stats()
+        return stats
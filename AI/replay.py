@@ -0,0 +1,289 @@
+import argparse
+import collections
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from algorithm import optimize_state
+from artifacts import DEFAULT_ARTIFACT_DIR
+from congestion_log import read_congestion_log
+from road_network import RoadNetwork
+from signal_controller import SignalController, CLEARANCE_NAMES
+from traffic_state import TrafficState, PHASE_NAMES, CONGESTION_LEVELS, CAR, PHASE_A, PHASE_B
+
+TRACE_COLUMNS = ("timestamp", "intersection", "computed_phase", "phase", "green_duration", "congestion_level", "cars")
+
+
+def load_models(config):
+    """
+    Controllers of the configured operation mode, read from the persisted artifacts (or the
+    frozen rl_policy_path). Replay never trains or saves a model, so it evaluates what is
+    persisted without touching the artifact directory; a missing artifact is an error.
+    """
+    mode = config.get("operation_mode", "normal")
+    if mode not in ("ml", "rl"):
+        return None, None
+    artifact_dir = config.get("artifact_dir", DEFAULT_ARTIFACT_DIR)
+    if mode == "rl":
+        if config.get("rl_policy_path"):
+            from rl_policy import FrozenPolicy
+            return FrozenPolicy(config["rl_policy_path"]), None
+        from rl_agent import RLAgent
+        model = RLAgent()
+    else:
+        from ml_predictor import MLModel
+        model = MLModel()
+    if not model.load(artifact_dir):
+        raise FileNotFoundError(f"No usable {model.artifact_name} artifact in {artifact_dir}; "
+                                f"run main.py in {mode} mode once to train it")
+    return (model, None) if mode == "rl" else (None, model)
+
+
+def replay_ticks(ticks, config, rl_agent=None, ml_model=None, network=None):
+    """
+    Drives the controller over recorded (timestamp, traffic_data) ticks in simulated time.
+    Yields one list of per-intersection decision records per tick.
+    """
+    alpha = config.get("prediction_alpha", 0.7)
+    controller = SignalController.from_config(config)
+    predicted = {}
+    for timestamp, traffic_data in ticks:
+        state = TrafficState.from_dicts(traffic_data)
+        for i, inter_no in enumerate(state.ids):
+            if inter_no in predicted:
+                state.predicted[i] = predicted[inter_no]
+        state.update_predictions(alpha)
+        for i, inter_no in enumerate(state.ids):
+            predicted[inter_no] = state.predicted[i]
+
+        result = optimize_state(state, config, timestamp, rl_agent, ml_model, network)
+        phases = result["phase"].tolist()
+        computed = {inter_no: PHASE_NAMES[p] for inter_no, p in zip(state.ids, phases)}
+        controller.plan(state.ids, result["phase"], np.where(result["green"][:, 0], PHASE_A, PHASE_B),
+                        result["dynamic_duration"], timestamp.timestamp())
+        final = controller.phases(state.ids)
+
+        durations = result["dynamic_duration"].tolist()
+        congestion = result["congestion"].tolist()
+        cars = state.counts[:, :, CAR].sum(axis=1).tolist()
+        yield [{
+            "timestamp": timestamp,
+            "intersection": state.ids[i],
+            "computed_phase": computed[state.ids[i]],
+            "phase": final[state.ids[i]],
+            "green_duration": round(durations[i], 1),
+            "congestion_level": CONGESTION_LEVELS[congestion[i]],
+            "cars": cars[i],
+        } for i in range(len(state))]
+
+
+def new_summary():
+    return {"ticks": 0, "switches": 0, "held": 0, "cars": 0, "green_duration_sum": 0.0,
+            "phase_ticks": {name: 0 for name in PHASE_NAMES + CLEARANCE_NAMES},
+            "congestion_ticks": {level: 0 for level in CONGESTION_LEVELS}}
+
+
+def summarize(records, summaries, boundaries):
+    """
+    Adds one tick to the summaries; `boundaries` tracks each intersection's [first, last] green
+    phase, so a change of phase counts as one switch however long its clearance took.
+    """
+    for record in records:
+        inter_no = record["intersection"]
+        summary = summaries.setdefault(inter_no, new_summary())
+        summary["ticks"] += 1
+        summary["cars"] += record["cars"]
+        summary["green_duration_sum"] += record["green_duration"]
+        summary["phase_ticks"][record["phase"]] += 1
+        summary["congestion_ticks"][record["congestion_level"]] += 1
+        if record["computed_phase"] != record["phase"]:
+            summary["held"] += 1
+        if record["phase"] in CLEARANCE_NAMES:
+            continue
+        boundary = boundaries.get(inter_no)
+        if boundary is None:
+            boundaries[inter_no] = [record["phase"], record["phase"]]
+            continue
+        if boundary[1] != record["phase"]:
+            summary["switches"] += 1
+        boundary[1] = record["phase"]
+
+
+def merge_summaries(parts):
+    """
+    Merges (summaries, boundaries) of consecutive stretches of the replay, oldest first.
+    A phase change across the seam between two stretches counts as a switch.
+    """
+    merged, last_phase = {}, {}
+    for part, boundaries in parts:
+        for inter_no, summary in part.items():
+            total = merged.setdefault(inter_no, new_summary())
+            for key in ("ticks", "switches", "held", "cars", "green_duration_sum"):
+                total[key] += summary[key]
+            for key in ("phase_ticks", "congestion_ticks"):
+                for name, count in summary[key].items():
+                    total[key][name] += count
+        for inter_no, (first, last) in boundaries.items():
+            if inter_no in last_phase and last_phase[inter_no] != first:
+                merged[inter_no]["switches"] += 1
+            last_phase[inter_no] = last
+    for summary in merged.values():
+        summary["mean_green_duration"] = round(summary["green_duration_sum"] / summary["ticks"], 2) if summary["ticks"] else 0.0
+    return merged
+
+
+def run_replay(ticks, config, trace_path=None, warmup=0, models=None):
+    """
+    Replays `ticks` to completion. The first `warmup` ticks only prime the EMA predictions and
+    signal timing and are not reported. `models` is an (rl_agent, ml_model) pair from
+    load_models, loaded here when not given. Returns (ticks reported, summaries, boundaries).
+    """
+    rl_agent, ml_model = models if models is not None else load_models(config)
+    network = RoadNetwork.from_config(config)
+    summaries, boundaries = {}, {}
+    tick_count = 0
+    trace_file = open(trace_path, "w", newline="") if trace_path else None
+    try:
+        writer = csv.writer(trace_file) if trace_file else None
+        if writer:
+            writer.writerow(TRACE_COLUMNS)
+        for n, records in enumerate(replay_ticks(ticks, config, rl_agent, ml_model, network)):
+            if n < warmup:
+                continue
+            tick_count += 1
+            summarize(records, summaries, boundaries)
+            if writer:
+                writer.writerows([record[c] for c in TRACE_COLUMNS] for record in records)
+    finally:
+        if trace_file:
+            trace_file.close()
+    return tick_count, summaries, boundaries
+
+
+# Models loaded once by the parent and handed to every pool worker.
+_worker_models = None
+
+
+def _init_worker(models):
+    global _worker_models
+    _worker_models = models
+
+
+def _chunk_task(args):
+    ticks, config, trace_path, warmup = args
+    return run_replay(ticks, config, trace_path, warmup, _worker_models)
+
+
+def default_warmup_seconds(config):
+    """Simulated time that covers the longest green plus its clearance."""
+    timing = config.get("signal_timing", {})
+    return timing.get("max_green", 120.0) + timing.get("yellow", 3.0) + timing.get("all_red", 1.0)
+
+
+def replay_parallel(paths, config, workers, chunk_ticks, warmup_seconds, trace_path=None, models=None):
+    """
+    Splits the tick stream into consecutive chunks of `chunk_ticks` replayed by a process pool.
+    Every tick is optimized once, plus the ticks of the `warmup_seconds` of simulated time before
+    each chunk, replayed unreported to prime the EMA predictions and signal timing. The result is
+    approximate: a chunk starts its signal timing afresh, so intervals near a seam can differ from
+    a serial replay. Ticks are read once, in constant memory: at most 2 * workers chunks are in
+    flight. Chunk traces are concatenated into `trace_path` in order. `models` (see run_replay) are
+    loaded once, in this process, and shared by all workers. Returns (tick count, merged summaries).
+    """
+    def part_path(n):
+        if not trace_path:
+            return None
+        stem, ext = os.path.splitext(trace_path)
+        return f"{stem}.part{n}{ext}"
+
+    results, in_flight, parts = [], collections.deque(), []
+    history = collections.deque()
+    if models is None:
+        models = load_models(config)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(models,)) as pool:
+        def submit(chunk):
+            if len(in_flight) >= 2 * workers:
+                results.append(in_flight.popleft().result())
+            start = chunk[0][0]
+            while history and (start - history[0][0]).total_seconds() > warmup_seconds:
+                history.popleft()
+            parts.append(part_path(len(parts)))
+            in_flight.append(pool.submit(_chunk_task, (list(history) + chunk, config, parts[-1], len(history))))
+            history.extend(chunk)
+
+        chunk = []
+        for tick in read_congestion_log(paths):
+            chunk.append(tick)
+            if len(chunk) == chunk_ticks:
+                submit(chunk)
+                chunk = []
+        if chunk:
+            submit(chunk)
+        results.extend(future.result() for future in in_flight)
+
+    if trace_path:
+        with open(trace_path, "w", newline="") as out:
+            out.write(",".join(TRACE_COLUMNS) + "\r\n")
+            for path in parts:
+                with open(path, "r", newline="") as part:
+                    part.readline()
+                    for line in part:
+                        out.write(line)
+                os.remove(path)
+    tick_count = sum(ticks for ticks, _, _ in results)
+    return tick_count, merge_summaries((summaries, boundaries) for _, summaries, boundaries in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded congestion logs through the signal controller.")
+    parser.add_argument("logs", nargs="+", help="congestion_log.txt or compact CSV logs, oldest first")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--mode", choices=["normal", "ml", "rl"], help="override operation_mode from the config")
+    parser.add_argument("--trace", help="write per-intersection decisions to this CSV")
+    parser.add_argument("--summary", help="write summary statistics to this JSON file")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-ticks", type=int, default=5000, help="ticks per parallel job")
+    parser.add_argument("--warmup-seconds", type=float,
+                        help="simulated seconds replayed before each chunk to prime the controller state "
+                             "(default: max_green + yellow + all_red)")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    if args.mode:
+        config["operation_mode"] = args.mode
+
+    try:
+        models = load_models(config)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    start = time.perf_counter()
+    if args.workers > 1:
+        warmup_seconds = args.warmup_seconds if args.warmup_seconds is not None else default_warmup_seconds(config)
+        tick_count, summaries = replay_parallel(args.logs, config, args.workers, args.chunk_ticks,
+                                                warmup_seconds, args.trace, models)
+    else:
+        tick_count, summary, boundaries = run_replay(read_congestion_log(args.logs), config, args.trace, models=models)
+        summaries = merge_summaries([(summary, boundaries)])
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "ticks": tick_count,
+        "elapsed_s": round(elapsed, 3),
+        "ticks_per_s": round(tick_count / elapsed, 1) if elapsed else None,
+        "intersections": summaries,
+    }
+    print(f"Replayed {tick_count} ticks in {elapsed:.2f}s ({report['ticks_per_s']} ticks/s)")
+    for inter_no, summary in summaries.items():
+        print(f"Intersection {inter_no}: {summary['switches']} switches, {summary['held']} held, "
+              f"mean green {summary['mean_green_duration']}s, phases {summary['phase_ticks']}")
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
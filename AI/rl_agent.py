@@ -1,8 +1,13 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import io
 import random
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from traffic_env import TrafficEnv, rollout_worker
+from rl_policy import BatchedPolicy
+from artifacts import save_artifact, load_artifact, DEFAULT_ARTIFACT_DIR
 
 class DQN(nn.Module):
     def __init__(self, input_dim, output_dim):
@@ -16,26 +21,114 @@ class DQN(nn.Module):
         x = torch.relu(self.fc2(x))
         return self.fc3(x)
 
+class SumTree:
+    """
+    Array-backed binary sum tree over transition priorities.
+    Leaves live at [size, 2 * size); every internal node holds the sum of its children,
+    so batched updates and prefix-sum lookups both cost O(batch * log capacity).
+    """
+    def __init__(self, capacity):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.depth = self.size.bit_length() - 1
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices, dtype=np.int64) + self.size
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Leaf index whose cumulative priority range contains each value."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values > self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.size
+
 class ReplayBuffer:
-    def __init__(self, capacity=10000):
+    """
+    Preallocated ring buffer of transitions stored as contiguous NumPy arrays.
+    sample() draws indices in one vectorized call and returns batch arrays ready for
+    torch.from_numpy. With prioritized=True, indices are drawn proportionally to
+    priority^alpha from a sum tree and importance-sampling weights are returned.
+    """
+    def __init__(self, capacity=10000, state_dim=4, prioritized=False, alpha=0.6, beta=0.4, beta_increment=1e-4):
         self.capacity = capacity
-        self.buffer = []
         self.position = 0
-    
+        self.size = 0
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity) if prioritized else None
+
     def push(self, state, action, reward, next_state, done):
-        if len(self.buffer) < self.capacity:
-            self.buffer.append(None)
-        self.buffer[self.position] = (state, action, reward, next_state, done)
-        self.position = (self.position + 1) % self.capacity
-    
+        self.push_batch(np.asarray(state)[None], [action], [reward], np.asarray(next_state)[None], [done])
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        n = len(actions)
+        if n > self.capacity:
+            states, actions, rewards, next_states, dones = (np.asarray(x)[-self.capacity:] for x in
+                                                            (states, actions, rewards, next_states, dones))
+            n = self.capacity
+        indices = (self.position + np.arange(n)) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        if self.prioritized:
+            self.tree.update(indices, np.full(n, self.max_priority ** self.alpha))
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
     def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
-    
+        """Returns (states, actions, rewards, next_states, dones, indices, weights) as NumPy arrays."""
+        if self.prioritized:
+            total = self.tree.total()
+            segments = (np.arange(batch_size) + np.random.random_sample(batch_size)) * (total / batch_size)
+            indices = np.minimum(self.tree.find(segments), self.size - 1)
+            probs = self.tree.tree[indices + self.tree.size] / total
+            weights = (self.size * probs) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+            self.beta = min(1.0, self.beta + self.beta_increment)
+        else:
+            indices = np.random.randint(0, self.size, size=batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], indices, weights)
+
+    def update_priorities(self, indices, td_errors):
+        if not self.prioritized:
+            return
+        priorities = np.abs(td_errors) + 1e-6
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
     def __len__(self):
-        return len(self.buffer)
+        return self.size
+
+class DeepRLAgent(BatchedPolicy):
+    artifact_name = "rl_agent"
+    artifact_version = 1
 
-class DeepRLAgent:
-    def __init__(self, input_dim=4, output_dim=2, lr=1e-3, gamma=0.9, epsilon=0.2):
+    def __init__(self, input_dim=4, output_dim=2, lr=1e-3, gamma=0.9, epsilon=0.2, prioritized_replay=False):
         self.input_dim = input_dim
         self.output_dim = output_dim
         self.gamma = gamma
@@ -43,75 +136,139 @@ class DeepRLAgent:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = DQN(input_dim, output_dim).to(self.device)
         self.optimizer = optim.Adam(self.model.parameters(), lr=lr)
-        self.replay_buffer = ReplayBuffer(capacity=10000)
+        self.replay_buffer = ReplayBuffer(capacity=10000, state_dim=input_dim, prioritized=prioritized_replay)
         self.batch_size = 32
     
-    def choose_action(self, state):
-        if random.random() < self.epsilon:
+    def choose_action(self, state, explore=False):
+        """Greedy action; epsilon-greedy only with explore=True, i.e. while training."""
+        if explore and random.random() < self.epsilon:
             return random.randrange(self.output_dim)
         state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
         with torch.no_grad():
             q_values = self.model(state_tensor)
         return int(torch.argmax(q_values).item())
+
+    def choose_actions(self, states, explore=False):
+        """
+        Actions for a whole batch of states with one forward pass: greedy when serving,
+        epsilon-greedy with explore=True while training.
+        """
+        with torch.inference_mode():
+            q_values = self.model(torch.from_numpy(np.asarray(states, dtype=np.float32)).to(self.device))
+        actions = q_values.argmax(dim=1).cpu().numpy()
+        if not explore:
+            return actions
+        explore = np.random.random_sample(len(actions)) < self.epsilon
+        return np.where(explore, np.random.randint(0, self.output_dim, size=len(actions)), actions)
     
-    def update(self):
-        if len(self.replay_buffer) < self.batch_size:
+    def update(self, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        if len(self.replay_buffer) < batch_size:
             return
-        transitions = self.replay_buffer.sample(self.batch_size)
-        batch = list(zip(*transitions))
-        states = torch.FloatTensor(np.array(batch[0])).to(self.device)
-        actions = torch.LongTensor(batch[1]).unsqueeze(1).to(self.device)
-        rewards = torch.FloatTensor(batch[2]).unsqueeze(1).to(self.device)
-        next_states = torch.FloatTensor(np.array(batch[3])).to(self.device)
-        dones = torch.FloatTensor(batch[4]).unsqueeze(1).to(self.device)
-        
+        states, actions, rewards, next_states, dones, indices, weights = self.replay_buffer.sample(batch_size)
+        states = torch.from_numpy(states).to(self.device)
+        actions = torch.from_numpy(actions).unsqueeze(1).to(self.device)
+        rewards = torch.from_numpy(rewards).unsqueeze(1).to(self.device)
+        next_states = torch.from_numpy(next_states).to(self.device)
+        dones = torch.from_numpy(dones).unsqueeze(1).to(self.device)
+
         q_values = self.model(states).gather(1, actions)
         with torch.no_grad():
             next_q_values = self.model(next_states).max(1)[0].unsqueeze(1)
         target = rewards + self.gamma * next_q_values * (1 - dones)
-        loss = nn.MSELoss()(q_values, target)
+        if self.replay_buffer.prioritized:
+            td_errors = q_values - target
+            loss = (torch.from_numpy(weights).unsqueeze(1).to(self.device) * td_errors.pow(2)).mean()
+            self.replay_buffer.update_priorities(indices, td_errors.detach().squeeze(1).cpu().numpy())
+        else:
+            loss = nn.MSELoss()(q_values, target)
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
     
-    def train_agent(self, episodes=1000, steps_per_episode=10):
-        for episode in range(episodes):
-            state = np.array([random.randint(0,20), random.randint(0,20), random.random(), random.random()])
-            for _ in range(steps_per_episode):
-                action = self.choose_action(state)
-                ns, ew, weather, conn = state
-                reward = - (ew + weather * 2) if action == 0 else - (ns + weather * 2)
-                next_state = np.array([random.randint(0,20), random.randint(0,20), random.random(), random.random()])
-                done = False
-                self.replay_buffer.push(state, action, reward, next_state, done)
-                state = next_state
+    def train_agent(self, episodes=1000, steps_per_episode=10, num_envs=64, workers=0, env_kwargs=None,
+                    updates_per_step=None):
+        """
+        Trains on the vectorized TrafficEnv: `num_envs` intersections step in lockstep and every
+        step pushes a whole batch of transitions followed by `updates_per_step` gradient updates.
+        episodes * steps_per_episode transitions are collected in total. updates_per_step defaults
+        to num_envs, which keeps the gradient steps of one update per transition at batch_size.
+        With workers > 0, rollouts are collected by a process pool from a snapshot of the weights.
+        """
+        env_kwargs = dict(env_kwargs or {}, episode_length=steps_per_episode)
+        rounds = max(1, -(-episodes // num_envs))
+        updates_per_step = num_envs if updates_per_step is None else updates_per_step
+        if workers > 0:
+            self._train_parallel(rounds, steps_per_episode, num_envs, workers, env_kwargs, updates_per_step)
+            return
+        env = TrafficEnv(num_envs=num_envs, **env_kwargs)
+        states = env.observations()
+        no_dones = np.zeros(num_envs, dtype=np.float32)
+        for _ in range(rounds * steps_per_episode):
+            actions = self.choose_actions(states, explore=True)
+            next_states, rewards, _ = env.step(actions)
+            # Episodes end by time limit, not a terminal state, so transitions keep bootstrapping.
+            self.replay_buffer.push_batch(states, actions, rewards, next_states, no_dones)
+            states = env.observations()
+            for _ in range(updates_per_step):
                 self.update()
-    
-    def get_optimal_signals(self, traffic_data, config):
-        rl_signals = {}
-        base_duration = config.get("base_duration", 10)
-        extension_factor = config.get("extension_factor", 0.5)
-        max_extension = config.get("max_extension", 20)
-        for inter_no, roads in traffic_data.items():
-            ns = roads.get("north", {}).get("car", 0) + roads.get("south", {}).get("car", 0)
-            ew = roads.get("east", {}).get("car", 0) + roads.get("west", {}).get("car", 0)
-            weather = random.random()
-            connected = random.random()
-            state = np.array([ns, ew, weather, connected])
-            action = self.choose_action(state)
-            effective_count = ns if action == 1 else ew
-            dynamic_duration = base_duration + min(effective_count * extension_factor, max_extension)
-            rl_signals[inter_no] = {}
-            for road in roads.keys():
-                if (action == 0 and road in ["north", "south"]) or (action == 1 and road in ["east", "west"]):
-                    signal = "GREEN"
-                else:
-                    signal = "RED"
-                rl_signals[inter_no][road] = {
-                    "signal": signal,
-                    "dynamic_duration": round(dynamic_duration, 1)
-                }
-        return rl_signals
+
+    def _train_parallel(self, rounds, steps, num_envs, workers, env_kwargs, updates_per_step):
+        seeds = np.random.SeedSequence().generate_state(rounds * workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for r in range(rounds):
+                params = {k: v.detach().cpu().numpy() for k, v in self.model.state_dict().items()}
+                jobs = [(params, self.epsilon, -(-num_envs // workers), steps, int(seeds[r * workers + w]), env_kwargs)
+                        for w in range(workers)]
+                for transitions in pool.map(rollout_worker, jobs):
+                    self.replay_buffer.push_batch(*transitions)
+                for _ in range(steps * updates_per_step):
+                    self.update()
+
+    def artifact_metadata(self):
+        return {"input_dim": self.input_dim, "output_dim": self.output_dim}
+
+    def save(self, directory=DEFAULT_ARTIFACT_DIR):
+        """Persists weights, optimizer state and replay-buffer metadata as a checksummed artifact."""
+        buffer = self.replay_buffer
+        state = {
+            "model": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "epsilon": self.epsilon,
+            "gamma": self.gamma,
+            "replay": {"capacity": buffer.capacity, "size": buffer.size, "position": buffer.position,
+                       "beta": buffer.beta, "max_priority": buffer.max_priority},
+        }
+        payload = io.BytesIO()
+        torch.save(state, payload)
+        return save_artifact(directory, self.artifact_name, payload.getvalue(), self.artifact_version,
+                             self.artifact_metadata())
+
+    def load(self, directory=DEFAULT_ARTIFACT_DIR):
+        """Restores a compatible artifact; returns False when none exists so the caller can train."""
+        payload = load_artifact(directory, self.artifact_name, self.artifact_version, self.artifact_metadata())
+        if payload is None:
+            return False
+        state = torch.load(io.BytesIO(payload), map_location=self.device)
+        self.model.load_state_dict(state["model"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        self.epsilon = state["epsilon"]
+        self.gamma = state["gamma"]
+        # Transitions are not persisted; only the annealing state carries over.
+        self.replay_buffer.beta = state["replay"]["beta"]
+        self.replay_buffer.max_priority = state["replay"]["max_priority"]
+        return True
+
+    def export_policy(self, path):
+        """
+        Saves the Q-network as a frozen TorchScript module for rl_policy.FrozenPolicy,
+        which serves it without the training stack.
+        """
+        self.model.eval()
+        frozen = torch.jit.freeze(torch.jit.script(self.model))
+        frozen.save(path)
+        self.model.train()
+        return path
 
 # For backwards compatibility.
 RLAgent = DeepRLAgent
@@ -0,0 +1,71 @@
+import numpy as np
+import torch
+from traffic_state import ROADS, PHASE_ROADS
+
+
+class BatchedPolicy:
+    """
+    Per-tick RL decisions for every intersection at once.
+    Subclasses provide choose_actions(states, explore=False) for an (N, 4) batch; everything else
+    is shared between the training agent and the exported FrozenPolicy. Serving is always greedy.
+    """
+    def observe(self, ns, ew):
+        # Weather and connectivity are not sensed yet, so they are sampled as during training.
+        states = np.empty((len(ns), 4), dtype=np.float32)
+        states[:, 0] = ns
+        states[:, 1] = ew
+        states[:, 2:] = np.random.random_sample((len(ns), 2))
+        return states
+
+    def optimal_actions(self, ns, ew, config):
+        """Returns (actions, dynamic_durations) arrays for north-south and east-west car counts."""
+        ns = np.asarray(ns, dtype=np.float64)
+        ew = np.asarray(ew, dtype=np.float64)
+        actions = self.choose_actions(self.observe(ns, ew)) if len(ns) else np.zeros(0, dtype=np.int64)
+        base_duration = config.get("base_duration", 10)
+        extension_factor = config.get("extension_factor", 0.5)
+        max_extension = config.get("max_extension", 20)
+        effective_count = np.where(actions == 1, ns, ew)
+        durations = np.round(base_duration + np.minimum(effective_count * extension_factor, max_extension), 1)
+        return actions, durations
+
+    def get_optimal_signals(self, traffic_data, config):
+        ns = [roads.get("north", {}).get("car", 0) + roads.get("south", {}).get("car", 0) for roads in traffic_data.values()]
+        ew = [roads.get("east", {}).get("car", 0) + roads.get("west", {}).get("car", 0) for roads in traffic_data.values()]
+        actions, durations = self.optimal_actions(ns, ew, config)
+        green = PHASE_ROADS[actions].tolist()
+        rl_signals = {}
+        for i, (inter_no, roads) in enumerate(traffic_data.items()):
+            rl_signals[inter_no] = {}
+            for road in roads.keys():
+                is_green = road in ROADS and green[i][ROADS.index(road)]
+                rl_signals[inter_no][road] = {
+                    "signal": "GREEN" if is_green else "RED",
+                    "dynamic_duration": float(durations[i])
+                }
+        return rl_signals
+
+
+class FrozenPolicy(BatchedPolicy):
+    """
+    Inference-only DQN policy loaded from a TorchScript file written by
+    DeepRLAgent.export_policy. Needs neither the DQN class nor the optimizer or replay buffer.
+    """
+    def __init__(self, path, epsilon=0.0):
+        self.path = path
+        self.module = torch.jit.load(path, map_location="cpu")
+        self.module.eval()
+        self.epsilon = epsilon
+
+    def __reduce__(self):
+        # TorchScript modules do not pickle; other processes reload the file instead.
+        return FrozenPolicy, (self.path, self.epsilon)
+
+    def choose_actions(self, states, explore=False):
+        with torch.inference_mode():
+            q_values = self.module(torch.from_numpy(np.ascontiguousarray(states, dtype=np.float32)))
+        actions = q_values.argmax(dim=1).numpy()
+        if explore and self.epsilon:
+            explore = np.random.random_sample(len(actions)) < self.epsilon
+            actions = np.where(explore, np.random.randint(0, q_values.shape[1], size=len(actions)), actions)
+        return actions
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_ADJACENT_WEIGHT = 0.5
+# Id orderings whose re-indexed edges are kept; camera feeds dropping in and out cycle through a few.
+ALIGNED_CACHE_SIZE = 8
+
+def get_adjacent_ids(inter_id, rows, cols):
+    row = (inter_id - 1) // cols
+    col = (inter_id - 1) % cols
+    adjacent = []
+    if row > 0:
+        adjacent.append((row - 1) * cols + col + 1)
+    if row < rows - 1:
+        adjacent.append((row + 1) * cols + col + 1)
+    if col > 0:
+        adjacent.append(row * cols + (col - 1) + 1)
+    if col < cols - 1:
+        adjacent.append(row * cols + (col + 1) + 1)
+    return adjacent
+
+
+class RoadNetwork:
+    """
+    Weighted road-network graph between intersections, built once at startup.
+    Edges are stored as flat (target, source, weight) arrays so the neighbour term of the
+    optimizer is one sparse matrix-vector product per phase, O(edges).
+    """
+    def __init__(self, ids, edges):
+        self.ids = [str(inter_no) for inter_no in ids]
+        position = {inter_no: i for i, inter_no in enumerate(self.ids)}
+        merged = {}
+        for target, source, weight in edges:
+            target, source = str(target), str(source)
+            if target == source or target not in position or source not in position:
+                continue
+            merged[(position[target], position[source])] = float(weight)
+        pairs = sorted(merged)
+        self.targets = np.array([t for t, _ in pairs], dtype=np.int64)
+        self.sources = np.array([s for _, s in pairs], dtype=np.int64)
+        self.weights = np.array([merged[p] for p in pairs], dtype=np.float64)
+        self._aligned = OrderedDict()
+
+    def __len__(self):
+        return len(self.weights)
+
+    @classmethod
+    def from_grid(cls, rows, cols, weight=DEFAULT_ADJACENT_WEIGHT):
+        ids = [str(i) for i in range(1, rows * cols + 1)]
+        edges = [(inter_no, adj, weight) for inter_no in ids for adj in get_adjacent_ids(int(inter_no), rows, cols)]
+        return cls(ids, edges)
+
+    @classmethod
+    def from_adjacency(cls, adjacency, ids=None, weight=DEFAULT_ADJACENT_WEIGHT, directed=False):
+        """
+        Builds the graph from an adjacency block. Each value may be a single id ("1": "2"),
+        a list of ids ("1": ["2", "4"]) or a map of id to edge weight ("1": {"2": 0.3}).
+        Links are undirected unless `directed` is set.
+        """
+        edges = []
+        nodes = set()
+        for inter_no, neighbors in adjacency.items():
+            if isinstance(neighbors, dict):
+                links = neighbors.items()
+            elif isinstance(neighbors, (list, tuple)):
+                links = [(adj, weight) for adj in neighbors]
+            else:
+                links = [(neighbors, weight)]
+            for adj, w in links:
+                edges.append((inter_no, adj, w))
+                if not directed:
+                    edges.append((adj, inter_no, w))
+                nodes.update((str(inter_no), str(adj)))
+        if ids is None:
+            ids = sorted(nodes, key=lambda k: (not k.isdigit(), int(k) if k.isdigit() else 0, k))
+        return cls(ids, edges)
+
+    @classmethod
+    def from_config(cls, config, ids=None):
+        """Explicit `adjacency` blocks take precedence over the grid layout; None if neither exists."""
+        weight = config.get("adjacent_weight", DEFAULT_ADJACENT_WEIGHT)
+        if config.get("adjacency"):
+            return cls.from_adjacency(config["adjacency"], ids, weight, config.get("adjacency_directed", False))
+        if "grid" in config:
+            return cls.from_grid(config["grid"]["rows"], config["grid"]["cols"], weight)
+        return None
+
+    def aligned(self, ids):
+        """Edge arrays re-indexed to the positions of `ids`; edges to absent intersections are dropped."""
+        key = tuple(ids)
+        if key == tuple(self.ids):
+            return self.targets, self.sources, self.weights
+        edges = self._aligned.get(key)
+        if edges is None:
+            position = {inter_no: i for i, inter_no in enumerate(ids)}
+            remap = np.array([position.get(inter_no, -1) for inter_no in self.ids], dtype=np.int64)
+            targets, sources = remap[self.targets], remap[self.sources]
+            keep = (targets >= 0) & (sources >= 0)
+            edges = (targets[keep], sources[keep], self.weights[keep])
+            self._aligned[key] = edges
+            if len(self._aligned) > ALIGNED_CACHE_SIZE:
+                self._aligned.popitem(last=False)
+        else:
+            self._aligned.move_to_end(key)
+        return edges
+
+    def influence(self, values, ids=None):
+        """Weighted sum of neighbour values for every intersection (sparse matrix-vector product)."""
+        targets, sources, weights = self.aligned(ids) if ids is not None else (self.targets, self.sources, self.weights)
+        return np.bincount(targets, weights=weights * values[sources], minlength=len(values))
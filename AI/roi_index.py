@@ -0,0 +1,125 @@
+import numpy as np
+from traffic_state import VEHICLE_CLASSES
+
+
+class ROILayout:
+    """
+    Road ROI geometry compiled once at native capture resolution.
+    Each valid ROI becomes a pair of slice objects, so cropping a frame is a zero-copy view;
+    ROIs outside the frame are reported once here instead of on every frame.
+    """
+    def __init__(self, intersections_config, frame_width, frame_height):
+        self.order = []
+        self.keys = []
+        self.slices = []
+        for inter_no, inter_data in intersections_config.items():
+            for road_no, roi in inter_data.get("roads", {}).items():
+                self.order.append((inter_no, road_no))
+                x, y, w, h = [int(coord) for coord in roi]
+                if w <= 0 or h <= 0 or y < 0 or x < 0 or y+h > frame_height or x+w > frame_width:
+                    print(f"Skipping invalid ROI for Intersection {inter_no}, Road {road_no}")
+                    continue
+                self.keys.append((inter_no, road_no))
+                self.slices.append((slice(y, y + h), slice(x, x + w)))
+        self.rects = np.array([(sx.start, sy.start, sx.stop, sy.stop) for sy, sx in self.slices],
+                              dtype=np.int32).reshape(-1, 4)
+
+    def sizes(self):
+        """(width, height) of every valid ROI, e.g. to size the detector input."""
+        return [(x2 - x1, y2 - y1) for x1, y1, x2, y2 in self.rects.tolist()]
+
+    def crops(self, frame):
+        """Zero-copy views of every valid ROI, in the order of self.keys."""
+        return [frame[sy, sx] for sy, sx in self.slices]
+
+    def empty_traffic_data(self):
+        """traffic_data with every road present and zero counts, invalid ROIs included."""
+        traffic_data = {}
+        for inter_no, road_no in self.order:
+            traffic_data.setdefault(inter_no, {})[road_no] = dict.fromkeys(VEHICLE_CLASSES, 0)
+        return traffic_data
+
+
+class ROIIndex:
+    """
+    Spatial index over every road ROI of a camera frame.
+    The frame is split into square cells and each cell stores the ROIs that overlap it,
+    so a detection box is assigned to its road with one table lookup instead of a scan.
+    """
+    def __init__(self, intersections_config, frame_width, frame_height, scale_factor=1.0, cell_size=32):
+        self.cell_size = cell_size
+        self.frame_width = int(frame_width * scale_factor)
+        self.frame_height = int(frame_height * scale_factor)
+        self.keys = []
+        rects = []
+        for inter_no, inter_data in intersections_config.items():
+            for road_no, roi in inter_data.get("roads", {}).items():
+                x, y, w, h = [int(coord * scale_factor) for coord in roi]
+                self.keys.append((inter_no, road_no))
+                rects.append((x, y, x + w, y + h))
+        self.rois = np.array(rects, dtype=np.float32).reshape(-1, 4)
+
+        self.grid_cols = max(1, -(-self.frame_width // cell_size))
+        self.grid_rows = max(1, -(-self.frame_height // cell_size))
+        cells = [[[] for _ in range(self.grid_cols)] for _ in range(self.grid_rows)]
+        for idx, (x1, y1, x2, y2) in enumerate(self.rois):
+            if x2 <= x1 or y2 <= y1:
+                continue
+            c1 = max(0, int(x1) // cell_size)
+            c2 = min(self.grid_cols - 1, (int(x2) - 1) // cell_size)
+            r1 = max(0, int(y1) // cell_size)
+            r2 = min(self.grid_rows - 1, (int(y2) - 1) // cell_size)
+            for r in range(r1, r2 + 1):
+                for c in range(c1, c2 + 1):
+                    cells[r][c].append(idx)
+        depth = max([1] + [len(cell) for row in cells for cell in row])
+        self.table = np.full((self.grid_rows, self.grid_cols, depth), -1, dtype=np.int32)
+        for r, row in enumerate(cells):
+            for c, cell in enumerate(row):
+                self.table[r, c, :len(cell)] = cell
+
+    def assign(self, boxes):
+        """
+        Maps an (N, 4) array of x1, y1, x2, y2 boxes to ROI indices using each box centre.
+        Returns an (N,) int array holding -1 for boxes that fall outside every ROI.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) == 0:
+            return np.empty(0, dtype=np.int32)
+        cx = (boxes[:, 0] + boxes[:, 2]) * 0.5
+        cy = (boxes[:, 1] + boxes[:, 3]) * 0.5
+        gx = np.clip((cx // self.cell_size).astype(np.int64), 0, self.grid_cols - 1)
+        gy = np.clip((cy // self.cell_size).astype(np.int64), 0, self.grid_rows - 1)
+        candidates = self.table[gy, gx]
+        rects = self.rois[np.maximum(candidates, 0)]
+        inside = ((candidates >= 0)
+                  & (cx[:, None] >= rects[..., 0]) & (cx[:, None] < rects[..., 2])
+                  & (cy[:, None] >= rects[..., 1]) & (cy[:, None] < rects[..., 3]))
+        first = inside.argmax(axis=1)
+        hit = inside[np.arange(len(boxes)), first]
+        return np.where(hit, candidates[np.arange(len(boxes)), first], -1).astype(np.int32)
+
+    def count(self, detections):
+        """
+        Buckets full-frame detections into their road ROIs.
+        Returns counts in the traffic_data layout used by optimize_intersections.
+        """
+        class_ids = {name: i for i, name in enumerate(VEHICLE_CLASSES)}
+        boxes = np.array([d['bbox'] for d in detections], dtype=np.float32).reshape(-1, 4)
+        classes = np.array([class_ids.get(d['class'], -1) for d in detections], dtype=np.int64)
+        return self.to_traffic_data(self.count_arrays(boxes, classes))
+
+    def count_arrays(self, boxes, classes):
+        """(roads x classes) counts for (N, 4) boxes and (N,) VEHICLE_CLASSES indices."""
+        counts = np.zeros((len(self.keys), len(VEHICLE_CLASSES)), dtype=np.int64)
+        if len(boxes):
+            roi_ids = self.assign(boxes)
+            keep = (roi_ids >= 0) & (classes >= 0)
+            np.add.at(counts, (roi_ids[keep], classes[keep]), 1)
+        return counts
+
+    def to_traffic_data(self, counts):
+        traffic_data = {}
+        for (inter_no, road_no), row in zip(self.keys, counts.tolist()):
+            traffic_data.setdefault(inter_no, {})[road_no] = dict(zip(VEHICLE_CLASSES, row))
+        return traffic_data
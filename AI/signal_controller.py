@@ -0,0 +1,191 @@
+import heapq
+from collections import OrderedDict
+import numpy as np
+from traffic_state import PHASE_A, PHASE_B, PHASE_EMERGENCY, PHASE_NAMES, PHASE_ROADS
+
+GREEN, YELLOW, ALL_RED = range(3)
+SIGNAL_NAMES = ("GREEN", "YELLOW", "RED")
+# Reported by phases() instead of a phase name while an approach is being cleared.
+CLEARANCE_NAMES = ("YELLOW", "ALL_RED")
+POSITIONS_CACHE_SIZE = 8
+
+
+class SignalController:
+    """
+    Event-driven signal timing for every intersection.
+    Each intersection runs a GREEN -> YELLOW -> ALL_RED -> GREEN state machine whose interval
+    ends are kept in one heap, so advancing the clock costs O(log n) per phase change instead of
+    a pass over every intersection. plan() compares the optimizer's phase and green duration with
+    the current plan in one vectorized pass and only re-schedules intersections whose phase
+    changed or whose duration moved by at least `replan_threshold` seconds.
+
+    A green lasts its planned duration (at least `min_green`); when it ends and the optimizer
+    still wants the same phase it is extended, up to `max_green`, after which the cross street
+    gets `min_green`. A phase change cuts the green short once `min_green` has passed; an
+    emergency cuts it short at once. Every change of approach goes through yellow and all-red,
+    and once an approach has been cleared the cross street is served next, even if the optimizer
+    has since gone back to the cleared approach.
+    """
+    def __init__(self, min_green=5.0, yellow=3.0, all_red=1.0, max_green=120.0, replan_threshold=5.0):
+        self.min_green = min_green
+        self.yellow = yellow
+        self.all_red = all_red
+        self.max_green = max_green
+        self.replan_threshold = replan_threshold
+        self.ids = []
+        self.index = {}
+        self._positions = OrderedDict()
+        # Served phase and approach axis (0 north-south, 1 east-west), interval and its schedule.
+        self.phase = np.zeros(0, dtype=np.int64)
+        self.axis = np.zeros(0, dtype=np.int64)
+        self.interval = np.zeros(0, dtype=np.int64)
+        self.green_start = np.zeros(0, dtype=np.float64)
+        # Latest optimizer plan.
+        self.target_phase = np.zeros(0, dtype=np.int64)
+        self.target_axis = np.zeros(0, dtype=np.int64)
+        self.planned = np.zeros(0, dtype=np.float64)
+        self.generation = []
+        self.heap = []
+        self.replans = 0
+        self.transitions = 0
+        self.events = 0
+
+    @classmethod
+    def from_config(cls, config):
+        timing = config.get("signal_timing", {})
+        return cls(config.get("min_phase_duration", 5), timing.get("yellow", 3.0), timing.get("all_red", 1.0),
+                   timing.get("max_green", 120.0), timing.get("replan_threshold", 5.0))
+
+    def positions(self, ids):
+        """Slots of `ids`, registering unseen intersections; cached for the last few id lists."""
+        key = tuple(ids)
+        idx = self._positions.get(key)
+        if idx is None:
+            new = [inter_no for inter_no in dict.fromkeys(ids) if inter_no not in self.index]
+            if new:
+                for inter_no in new:
+                    self.index[inter_no] = len(self.ids)
+                    self.ids.append(inter_no)
+                    self.generation.append(0)
+                grow = len(new)
+                self.phase = np.append(self.phase, np.zeros(grow, dtype=np.int64))
+                self.axis = np.append(self.axis, np.zeros(grow, dtype=np.int64))
+                self.interval = np.append(self.interval, np.full(grow, -1, dtype=np.int64))
+                self.green_start = np.append(self.green_start, np.zeros(grow))
+                self.target_phase = np.append(self.target_phase, np.zeros(grow, dtype=np.int64))
+                self.target_axis = np.append(self.target_axis, np.zeros(grow, dtype=np.int64))
+                self.planned = np.append(self.planned, np.zeros(grow))
+            idx = self._positions[key] = np.array([self.index[inter_no] for inter_no in ids], dtype=np.int64)
+            if len(self._positions) > POSITIONS_CACHE_SIZE:
+                self._positions.popitem(last=False)
+        else:
+            self._positions.move_to_end(key)
+        return idx
+
+    def _schedule(self, i, at):
+        self.generation[i] += 1
+        heapq.heappush(self.heap, (at, i, self.generation[i]))
+
+    def _start_green(self, i, phase, axis, duration, now):
+        self.phase[i] = phase
+        self.axis[i] = axis
+        self.interval[i] = GREEN
+        self.green_start[i] = now
+        self._schedule(i, now + duration)
+
+    def plan(self, ids, phases, served_axis, durations, now):
+        """
+        Feeds one optimizer tick (per-intersection phase, served axis and green duration arrays)
+        at time `now` in seconds. Due interval changes are applied before and after re-planning,
+        so a green cut short at `now` turns yellow on this tick.
+        """
+        self.advance(now)
+        idx = self.positions(ids)
+        phases = np.asarray(phases, dtype=np.int64)
+        served_axis = np.asarray(served_axis, dtype=np.int64)
+        durations = np.clip(np.asarray(durations, dtype=np.float64), self.min_green, self.max_green)
+        replan = ((phases != self.target_phase[idx]) | (self.interval[idx] < 0)
+                  | (np.abs(durations - self.planned[idx]) >= self.replan_threshold))
+        for j in np.flatnonzero(replan).tolist():
+            self._replan(int(idx[j]), int(phases[j]), int(served_axis[j]), float(durations[j]), now)
+        if len(self.heap) > 4 * len(self.ids) + 64:
+            # Re-scheduling leaves superseded entries behind; keep only the live one per intersection.
+            self.heap = [entry for entry in self.heap if entry[2] == self.generation[entry[1]]]
+            heapq.heapify(self.heap)
+        self.advance(now)
+
+    def _replan(self, i, phase, axis, duration, now):
+        self.replans += 1
+        self.target_phase[i] = phase
+        self.target_axis[i] = axis
+        self.planned[i] = duration
+        if self.interval[i] < 0:
+            self._start_green(i, phase, axis, duration, now)
+        elif self.interval[i] == GREEN:
+            start = self.green_start[i]
+            if axis == self.axis[i]:
+                # Same approaches stay green (A <-> EMERGENCY on one axis is only a relabel).
+                self.phase[i] = phase
+                self._schedule(i, max(now, min(start + duration, start + self.max_green)))
+            elif phase == PHASE_EMERGENCY:
+                self._schedule(i, now)
+            else:
+                self._schedule(i, max(now, start + self.min_green))
+        # During yellow and all-red the new target is picked up when the next green starts.
+
+    def advance(self, now):
+        """Applies every interval change due by `now`; returns the ids whose signals changed."""
+        changed = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            at, i, generation = heapq.heappop(heap)
+            if generation != self.generation[i]:
+                continue
+            self.events += 1
+            # Each interval starts when the previous one was due, not when the tick noticed it.
+            if self._expire(i, at):
+                changed.append(self.ids[i])
+        return changed
+
+    def _expire(self, i, at):
+        interval = self.interval[i]
+        if interval == GREEN:
+            if self.target_axis[i] == self.axis[i] and at - self.green_start[i] < self.max_green:
+                self._schedule(i, min(at + self.planned[i], self.green_start[i] + self.max_green))
+                return False
+            self.interval[i] = YELLOW
+            self.transitions += 1
+            self._schedule(i, at + self.yellow)
+        elif interval == YELLOW:
+            self.interval[i] = ALL_RED
+            self._schedule(i, at + self.all_red)
+        else:
+            axis, phase, duration = self.target_axis[i], self.target_phase[i], self.planned[i]
+            if axis == self.axis[i] and phase != PHASE_EMERGENCY:
+                # The target went back to the cleared approach (or it maxed out): the clearance
+                # has been paid, so serve the cross street for its minimum green before returning.
+                # An emergency on the cleared approach is still served at once.
+                axis = 1 - self.axis[i]
+                phase, duration = (PHASE_A, PHASE_B)[axis], self.min_green
+            self._start_green(i, phase, axis, duration, at)
+        return True
+
+    def signals(self, ids):
+        """(n, 4) signal codes per approach (ROADS order): 0 green, 1 yellow, 2 red."""
+        idx = self.positions(ids)
+        served = PHASE_ROADS[self.axis[idx]]
+        interval = self.interval[idx][:, None]
+        return np.where(served & (interval == GREEN), GREEN, np.where(served & (interval == YELLOW), YELLOW, 2))
+
+    def phases(self, ids):
+        """
+        {intersection: phase name} of the phase that is green, or "YELLOW" / "ALL_RED" while its
+        approaches are being cleared, so green time is never counted through a clearance.
+        """
+        idx = self.positions(ids)
+        return {inter_no: PHASE_NAMES[p] if interval <= GREEN else CLEARANCE_NAMES[interval - 1]
+                for inter_no, p, interval in zip(ids, self.phase[idx].tolist(), self.interval[idx].tolist())}
+
+    def stats(self):
+        return {"intersections": len(self.ids), "replans": self.replans, "transitions": self.transitions,
+                "events": self.events, "pending": len(self.heap)}
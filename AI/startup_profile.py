@@ -0,0 +1,69 @@
+import builtins
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+_records = []
+_original_import = None
+# Import nesting depth per thread, so background model loads do not disturb the main thread's count.
+_local = threading.local()
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only time the outermost import of modules that are not loaded yet.
+    depth = getattr(_local, "depth", 0)
+    if depth or level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    _local.depth = depth + 1
+    start, rss = time.perf_counter(), rss_mb()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _local.depth = depth
+        _records.append(("import " + name, time.perf_counter() - start, rss_mb() - rss))
+
+
+def install():
+    """Starts timing top-level imports; call before importing anything heavy."""
+    global _original_import
+    if _original_import is None:
+        _original_import = builtins.__import__
+        builtins.__import__ = _timed_import
+
+
+def uninstall():
+    global _original_import
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+        _original_import = None
+
+
+def record(name, seconds, rss_delta):
+    _records.append((name, seconds, rss_delta))
+
+
+def report(min_seconds=0.0):
+    """Prints every recorded step, slowest first, and returns the records."""
+    rows = sorted((r for r in _records if r[1] >= min_seconds), key=lambda r: r[1], reverse=True)
+    print(f"Startup profile (RSS now {rss_mb():.1f} MB):")
+    for name, seconds, rss_delta in rows:
+        print(f"  {seconds * 1000:9.1f} ms  {rss_delta:+8.1f} MB  {name}")
+    return rows
@@ -0,0 +1,257 @@
+import itertools
+import cv2
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 box arrays."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker for the boxes of one ROI.
+    Matched tracks take the detected box and update a per-frame centroid velocity; between
+    detections boxes are propagated by that velocity (or by sparse optical flow when a
+    displacement is supplied) and their confidence decays every frame.
+    """
+    def __init__(self, iou_threshold=0.3, max_misses=2, confidence_decay=0.95, ids=None):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.confidence_decay = confidence_decay
+        self.ids = ids if ids is not None else itertools.count(1)
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 2), dtype=np.float32)
+        self.anchors = np.zeros((0, 2), dtype=np.float32)
+        self.track_ids = []
+        self.classes = []
+        self.extras = []
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.since_update = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def confidence(self):
+        """Lowest track confidence (1.0 right after a detection); 1.0 when nothing is tracked."""
+        if not len(self):
+            return 1.0
+        return float(self.confidence_decay ** self.since_update.max())
+
+    def predict(self, displacement=None):
+        """Moves every track one frame ahead; `displacement` (N, 2) overrides the velocity model."""
+        if not len(self):
+            return
+        shift = self.velocity if displacement is None else displacement.astype(np.float32)
+        self.boxes += np.hstack([shift, shift])
+        self.since_update += 1
+
+    def update(self, detections):
+        """
+        Associates a fresh detection list with the tracks (greedy, highest IoU first).
+        Returns the number of births plus deaths, a cheap measure of how wrong the propagation was.
+        """
+        det_boxes = np.array([d['bbox'] for d in detections], dtype=np.float32).reshape(-1, 4)
+        matched_tracks, matched_dets = [], []
+        if len(self) and len(det_boxes):
+            ious = iou_matrix(self.boxes, det_boxes)
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                t, d = divmod(int(flat), len(det_boxes))
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_dets:
+                    continue
+                matched_tracks.append(t)
+                matched_dets.append(d)
+
+        for t, d in zip(matched_tracks, matched_dets):
+            # Velocity from the centre at the previous detection, however the box was propagated since.
+            new_centre = (det_boxes[d, :2] + det_boxes[d, 2:]) * 0.5
+            self.velocity[t] = (new_centre - self.anchors[t]) / max(1, int(self.since_update[t]))
+            self.anchors[t] = new_centre
+            self.boxes[t] = det_boxes[d]
+            self.classes[t] = detections[d]['class']
+            self.extras[t] = {k: v for k, v in detections[d].items() if k not in ('bbox', 'class')}
+        self.misses += 1
+        self.misses[matched_tracks] = 0
+        self.since_update[matched_tracks] = 0
+
+        keep = self.misses <= self.max_misses
+        deaths = int((~keep).sum())
+        self._select(np.flatnonzero(keep))
+        births = [d for d in range(len(det_boxes)) if d not in matched_dets]
+        for d in births:
+            self.boxes = np.vstack([self.boxes, det_boxes[d:d + 1]])
+            self.velocity = np.vstack([self.velocity, np.zeros((1, 2), dtype=np.float32)])
+            self.anchors = np.vstack([self.anchors, (det_boxes[d:d + 1, :2] + det_boxes[d:d + 1, 2:]) * 0.5])
+            self.track_ids.append(next(self.ids))
+            self.classes.append(detections[d]['class'])
+            self.extras.append({k: v for k, v in detections[d].items() if k not in ('bbox', 'class')})
+            self.misses = np.append(self.misses, 0)
+            self.since_update = np.append(self.since_update, 0)
+        return len(births) + deaths
+
+    def prune(self, width, height):
+        """Drops tracks whose propagated centre has left the ROI; returns how many were dropped."""
+        centres = (self.boxes[:, :2] + self.boxes[:, 2:]) * 0.5
+        inside = (centres[:, 0] >= 0) & (centres[:, 0] < width) & (centres[:, 1] >= 0) & (centres[:, 1] < height)
+        self._select(np.flatnonzero(inside))
+        return int((~inside).sum())
+
+    def _select(self, idx):
+        self.boxes = self.boxes[idx]
+        self.velocity = self.velocity[idx]
+        self.anchors = self.anchors[idx]
+        self.track_ids = [self.track_ids[i] for i in idx]
+        self.classes = [self.classes[i] for i in idx]
+        self.extras = [self.extras[i] for i in idx]
+        self.misses = self.misses[idx]
+        self.since_update = self.since_update[idx]
+
+    def speed(self):
+        """Mean centroid speed in pixels per frame."""
+        return float(np.linalg.norm(self.velocity, axis=1).mean()) if len(self) else 0.0
+
+    def box_size(self):
+        """Median of the smaller box side, the scale a per-frame displacement is judged against."""
+        if not len(self):
+            return 0.0
+        sides = np.minimum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+        return float(np.median(sides))
+
+    def detections(self):
+        """Current tracks in the detector's output format, plus a stable 'track_id'."""
+        tracked = []
+        for box, track_id, cls, extra in zip(self.boxes.tolist(), self.track_ids, self.classes, self.extras):
+            detection = dict(extra, bbox=tuple(int(round(v)) for v in box), track_id=track_id)
+            detection['class'] = cls
+            tracked.append(detection)
+        return tracked
+
+
+class TrackedROI:
+    """Tracker and detection schedule of one ROI."""
+    def __init__(self, tracker, interval):
+        self.tracker = tracker
+        self.interval = interval
+        self.frames_since_detection = None
+        self.previous_gray = None
+        self.detections = 0
+
+
+class AdaptiveDetector:
+    """
+    Runs the detector on an ROI only every k frames, or sooner when its tracker's confidence
+    decays below `redetect_confidence`, and propagates tracked boxes in between.
+    k is re-tuned per ROI after each detection: fast traffic (relative to the box size) and
+    dense traffic shorten it, a detection that disagrees with the propagated tracks halves it,
+    and an agreeing detection lets it grow by one frame up to `max_interval`.
+    Exposes the detector's detect_batch interface, keyed by ROI.
+    """
+    keyed = True
+
+    def __init__(self, detector, min_interval=1, max_interval=10, iou_threshold=0.3, max_misses=2,
+                 confidence_decay=0.95, redetect_confidence=0.5, max_shift=0.5, density_ref=20,
+                 optical_flow=False):
+        self.detector = detector
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.confidence_decay = confidence_decay
+        self.redetect_confidence = redetect_confidence
+        self.max_shift = max_shift
+        self.density_ref = density_ref
+        self.optical_flow = optical_flow
+        self.rois = {}
+        self.ids = itertools.count(1)
+        self.frames = 0
+        self.detected = 0
+
+    @classmethod
+    def from_config(cls, detector, tracking_config):
+        return cls(detector, **{k: v for k, v in tracking_config.items() if k != "enabled"})
+
+    def _roi(self, key):
+        roi = self.rois.get(key)
+        if roi is None:
+            tracker = IoUTracker(self.iou_threshold, self.max_misses, self.confidence_decay, self.ids)
+            roi = self.rois[key] = TrackedROI(tracker, self.min_interval)
+        return roi
+
+    def _retune(self, roi, disagreement):
+        tracker = roi.tracker
+        if disagreement > max(1, len(tracker) // 4):
+            roi.interval = max(self.min_interval, roi.interval // 2)
+            return
+        limit = self.max_interval
+        speed = tracker.speed()
+        if speed > 0:
+            # Keep the drift between two detections under max_shift of a box side.
+            limit = min(limit, int(self.max_shift * tracker.box_size() / speed))
+        limit = int(limit / (1 + len(tracker) / self.density_ref))
+        roi.interval = max(self.min_interval, min(roi.interval + 1, limit))
+
+    def _flow(self, roi, gray):
+        # Sparse Lucas-Kanade flow of each track centre; lost points fall back to the velocity model.
+        tracker = roi.tracker
+        if roi.previous_gray is None or roi.previous_gray.shape != gray.shape or not len(tracker):
+            return None
+        points = ((tracker.boxes[:, :2] + tracker.boxes[:, 2:]) * 0.5).reshape(-1, 1, 2).astype(np.float32)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(roi.previous_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+        displacement = (moved - points).reshape(-1, 2)
+        return np.where(status.reshape(-1, 1) == 1, displacement, tracker.velocity)
+
+    def detect_batch(self, frames, keys):
+        """
+        Returns one detection list per ROI crop like VehicleDetector.detect_batch; `keys` names the
+        ROI of each crop so its tracker and schedule persist across frames.
+        """
+        self.frames += 1
+        due = []
+        for i, (key, frame) in enumerate(zip(keys, frames)):
+            roi = self._roi(key)
+            if (roi.frames_since_detection is None or roi.frames_since_detection + 1 >= roi.interval
+                    or roi.tracker.confidence() * self.confidence_decay < self.redetect_confidence):
+                due.append(i)
+            else:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if self.optical_flow else None
+                roi.tracker.predict(self._flow(roi, gray) if gray is not None else None)
+                roi.tracker.prune(frame.shape[1], frame.shape[0])
+                roi.previous_gray = gray
+                roi.frames_since_detection += 1
+
+        fresh = self.detector.detect_batch([frames[i] for i in due]) if due else []
+        for i, detections in zip(due, fresh):
+            roi = self.rois[keys[i]]
+            roi.tracker.predict()
+            roi.tracker.prune(frames[i].shape[1], frames[i].shape[0])
+            disagreement = roi.tracker.update(detections)
+            roi.frames_since_detection = 0
+            roi.detections += 1
+            roi.previous_gray = cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY) if self.optical_flow else None
+            self._retune(roi, disagreement)
+        self.detected += len(due)
+        return [self.rois[key].tracker.detections() for key in keys]
+
+    def roi_inferences(self):
+        """Detector runs per ROI key."""
+        return {key: roi.detections for key, roi in self.rois.items()}
+
+    def stats(self):
+        rois = len(self.rois)
+        intervals = [roi.interval for roi in self.rois.values()]
+        return {
+            "frames": self.frames,
+            "roi_detections": self.detected,
+            "detection_ratio": round(self.detected / (self.frames * rois), 3) if self.frames and rois else 0.0,
+            "mean_interval": round(float(np.mean(intervals)), 2) if intervals else 0.0,
+            "tracks": sum(len(roi.tracker) for roi in self.rois.values()),
+        }
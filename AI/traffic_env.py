@@ -0,0 +1,101 @@
+import numpy as np
+from traffic_state import PHASE_ROADS
+
+
+class TrafficEnv:
+    """
+    Vectorized queue model of many isolated intersections, stepped in lockstep.
+    Each env keeps a vehicle queue per approach (north, south, east, west). Vehicles arrive
+    as Poisson traffic; the phase picked by the action (0 = A, north-south green;
+    1 = B, east-west green, as in algorithm.py) discharges its approaches at the saturation
+    flow, reduced by bad weather and by the lost time of a phase change.
+    Observations match DeepRLAgent's state: [ns_queue, ew_queue, weather, connected].
+    """
+    def __init__(self, num_envs=64, arrival_rate=(0.02, 0.4), saturation_flow=0.5, step_seconds=5.0,
+                 switch_loss=2.0, max_queue=60, episode_length=10, seed=None):
+        self.num_envs = num_envs
+        self.arrival_rate = arrival_rate
+        self.saturation_flow = saturation_flow
+        self.step_seconds = step_seconds
+        self.switch_loss = switch_loss
+        self.max_queue = max_queue
+        self.episode_length = episode_length
+        self.rng = np.random.default_rng(seed)
+        self.queues = np.zeros((num_envs, 4), dtype=np.int64)
+        self.rates = np.zeros((num_envs, 4))
+        self.weather = np.zeros(num_envs)
+        self.connected = np.zeros(num_envs)
+        self.phase = np.zeros(num_envs, dtype=np.int64)
+        self.t = np.zeros(num_envs, dtype=np.int64)
+        self.reset()
+
+    def reset(self, mask=None):
+        idx = np.arange(self.num_envs) if mask is None else np.flatnonzero(mask)
+        n = len(idx)
+        self.queues[idx] = self.rng.integers(0, 11, size=(n, 4))
+        self.rates[idx] = self.rng.uniform(*self.arrival_rate, size=(n, 4))
+        self.weather[idx] = self.rng.random(n)
+        self.connected[idx] = self.rng.random(n)
+        self.phase[idx] = self.rng.integers(0, 2, size=n)
+        self.t[idx] = 0
+        return self.observations()
+
+    def observations(self):
+        return np.stack([self.queues[:, 0] + self.queues[:, 1],
+                         self.queues[:, 2] + self.queues[:, 3],
+                         self.weather, self.connected], axis=1).astype(np.float32)
+
+    def step(self, actions):
+        """
+        Advances every env by one decision interval. Returns (next_obs, rewards, truncated);
+        next_obs is observed before finished episodes are reset, so it is the right
+        transition target. Call observations() afterwards for the state to act on.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        green = PHASE_ROADS[actions]
+        switched = actions != self.phase
+        green_seconds = self.step_seconds - self.switch_loss * switched
+        capacity = self.saturation_flow * (1 - 0.3 * self.weather) * green_seconds
+        served = self.rng.poisson(np.repeat(capacity[:, None], 4, axis=1))
+        departures = np.where(green, np.minimum(self.queues, served), 0)
+        arrivals = self.rng.poisson(self.rates * self.step_seconds)
+        self.queues = np.minimum(self.queues - departures + arrivals, self.max_queue)
+        self.phase = actions
+        self.t += 1
+
+        # Penalise vehicles left waiting, more so in bad weather, plus a small cost per switch.
+        rewards = (-(self.queues.sum(axis=1) * (1 + self.weather)) / 10.0 - 0.5 * switched).astype(np.float32)
+        next_obs = self.observations()
+        truncated = self.t >= self.episode_length
+        if truncated.any():
+            self.reset(truncated)
+        return next_obs, rewards, truncated
+
+
+def q_values_numpy(params, states):
+    """Forward pass of the DQN from numpy weights, so rollout workers need no torch."""
+    x = np.maximum(states @ params["fc1.weight"].T + params["fc1.bias"], 0)
+    x = np.maximum(x @ params["fc2.weight"].T + params["fc2.bias"], 0)
+    return x @ params["fc3.weight"].T + params["fc3.bias"]
+
+
+def rollout_worker(args):
+    """Collects epsilon-greedy transitions from a private TrafficEnv; runs in a pool process."""
+    params, epsilon, num_envs, steps, seed, env_kwargs = args
+    env = TrafficEnv(num_envs=num_envs, seed=seed, **env_kwargs)
+    rng = np.random.default_rng(seed)
+    obs = env.observations()
+    num_actions = params["fc3.bias"].shape[0]
+    states, actions, rewards, next_states = [], [], [], []
+    for _ in range(steps):
+        greedy = q_values_numpy(params, obs).argmax(axis=1)
+        explore = rng.random(num_envs) < epsilon
+        action = np.where(explore, rng.integers(0, num_actions, size=num_envs), greedy)
+        next_obs, reward, _ = env.step(action)
+        states.append(obs)
+        actions.append(action)
+        rewards.append(reward)
+        next_states.append(next_obs)
+        obs = env.observations()
+    return (np.concatenate(states), np.concatenate(actions), np.concatenate(rewards),
+            np.concatenate(next_states), np.zeros(num_envs * steps, dtype=np.float32))
@@ -0,0 +1,59 @@
+import numpy as np
+
+ROADS = ("north", "south", "east", "west")
+VEHICLE_CLASSES = ("car", "ambulance", "schoolbus", "accident")
+CAR, AMBULANCE, SCHOOLBUS, ACCIDENT = range(len(VEHICLE_CLASSES))
+
+# Phase A serves north-south, phase B serves east-west.
+PHASE_A, PHASE_B, PHASE_EMERGENCY = 0, 1, 2
+PHASE_NAMES = ("A", "B", "EMERGENCY")
+PHASE_ROADS = np.array([[True, True, False, False],
+                        [False, False, True, True]])
+
+CONGESTION_LEVELS = ("low", "medium", "high")
+
+
+class TrafficState:
+    """
+    Compact array form of one tick of traffic data.
+    counts is (intersections x 4 approaches x 4 classes), predicted holds the EMA car
+    prediction per approach and present marks which approaches exist at each intersection.
+    """
+    def __init__(self, ids, counts=None, predicted=None, present=None):
+        self.ids = list(ids)
+        self.index = {inter_no: i for i, inter_no in enumerate(self.ids)}
+        n = len(self.ids)
+        self.counts = np.zeros((n, len(ROADS), len(VEHICLE_CLASSES)), dtype=np.int32) if counts is None else counts
+        self.predicted = np.zeros((n, len(ROADS)), dtype=np.float64) if predicted is None else predicted
+        self.present = np.ones((n, len(ROADS)), dtype=bool) if present is None else present
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_dicts(cls, traffic_data, prediction_data=None):
+        state = cls(traffic_data.keys())
+        state.present[:] = False
+        for i, (inter_no, roads) in enumerate(traffic_data.items()):
+            preds = prediction_data.get(inter_no, {}) if prediction_data is not None else {}
+            for r, road_no in enumerate(ROADS):
+                counts = roads.get(road_no)
+                if counts is not None:
+                    state.present[i, r] = True
+                    state.counts[i, r] = [counts.get(c, 0) for c in VEHICLE_CLASSES]
+                state.predicted[i, r] = preds.get(road_no, {}).get("car", 0)
+        return state
+
+    def to_traffic_data(self):
+        traffic_data = {}
+        for i, inter_no in enumerate(self.ids):
+            traffic_data[inter_no] = {
+                road_no: dict(zip(VEHICLE_CLASSES, self.counts[i, r].tolist()))
+                for r, road_no in enumerate(ROADS) if self.present[i, r]
+            }
+        return traffic_data
+
+    def update_predictions(self, alpha):
+        """Exponential moving average of car counts, for all approaches at once."""
+        self.predicted *= (1 - alpha)
+        self.predicted += alpha * self.counts[:, :, CAR]
@@ -0,0 +1,143 @@
+import asyncio
+import random
+from collections import OrderedDict
+import aiohttp
+
+
+class SignalUplink:
+    """
+    Non-blocking uplink for signal data.
+    submit() only records the latest snapshot per intersection in a bounded queue; a single
+    background task batches whatever is pending into one POST every `flush_interval` seconds,
+    reusing the session's connections and backing off exponentially while the API is failing.
+    """
+    def __init__(self, session, url, max_pending=1000, max_batch=500, flush_interval=1.0,
+                 timeout=5, max_backoff=30.0):
+        self.session = session
+        self.endpoint = url + "traffic/signal-data"
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_backoff = max_backoff
+        self.pending = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.backoff = 0.0
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    def submit(self, output_signals):
+        snapshots = {}
+        for item in output_signals:
+            snapshots.setdefault(item["intersection"], []).append(item)
+        for inter_no, items in snapshots.items():
+            self.submitted += 1
+            if inter_no in self.pending:
+                self.coalesced += 1
+                self.pending.move_to_end(inter_no)
+            self.pending[inter_no] = items
+        # Bounded queue: evict the oldest snapshots first.
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        if len(self.pending) >= self.max_batch and not self.backoff:
+            self.wakeup.set()
+
+    def _take_batch(self):
+        batch = []
+        while self.pending and len(batch) < self.max_batch:
+            batch.append(self.pending.popitem(last=False))
+        return batch
+
+    def _requeue(self, batch):
+        # Put unsent snapshots back at the front unless a newer one arrived meanwhile.
+        for inter_no, items in reversed(batch):
+            if inter_no in self.pending:
+                continue
+            self.pending[inter_no] = items
+            self.pending.move_to_end(inter_no, last=False)
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+
+    async def _post(self, batch):
+        """Returns True when the batch is done with (sent or rejected), False when it should be retried."""
+        data = [item for _, items in batch for item in items]
+        try:
+            async with self.session.post(self.endpoint, json={"data": data}, timeout=self.timeout) as response:
+                if response.status < 300:
+                    self.sent += len(batch)
+                    self.batches += 1
+                    return True
+                print(f"Failed to send data. Status code: {response.status}")
+                print(f"Response text: {await response.text()}")
+                if 400 <= response.status < 500 and response.status != 429:
+                    self.dropped += len(batch)  # The API will never accept this payload.
+                    return True
+        except aiohttp.ClientConnectorError as e:
+            print(f"Connection error: {e}")
+        except asyncio.TimeoutError:
+            print("Request timed out")
+        except aiohttp.ClientError as e:
+            print(f"An error occurred while sending data: {e}")
+        return False
+
+    async def flush(self):
+        while self.pending:
+            batch = self._take_batch()
+            try:
+                done = await self._post(batch)
+            except asyncio.CancelledError:
+                self._requeue(batch)
+                raise
+            if not done:
+                self._requeue(batch)
+                self.failures += 1
+                return False
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if await self.flush():
+                self.backoff = 0.0
+                continue
+            self.backoff = min(self.max_backoff, max(self.flush_interval, self.backoff * 2))
+            print(f"Uplink backing off for {self.backoff:.1f}s ({len(self.pending)} snapshots pending)")
+            await asyncio.sleep(self.backoff * random.uniform(0.8, 1.2))
+
+    def stats(self):
+        return {
+            "queue_depth": len(self.pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "batches": self.batches,
+            "failures": self.failures,
+            "backoff_s": self.backoff,
+        }
+
+    async def close(self, flush=True):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if flush:
+            await self.flush()
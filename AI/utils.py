@@ -1,6 +1,9 @@
 import cv2
 import json
 import datetime
+import os
+import threading
+import time
 
 def draw_roi(frame, roi, inter_no, road_no, counts, signal, dynamic_duration=None, mode="Normal"):
     x, y, w, h = roi
@@ -9,11 +12,15 @@ def draw_roi(frame, roi, inter_no, road_no, counts, signal, dynamic_duration=Non
             color = (255, 0, 0)       # Blue
         elif signal == "RED":
             color = (0, 255, 255)     # Yellow
+        elif signal == "YELLOW":
+            color = (0, 165, 255)     # Orange
         else:
             color = (255, 0, 255)     # Purple (fallback)
     else:
         if signal == "GREEN":
             color = (0, 255, 0)       # Green
+        elif signal == "YELLOW":
+            color = (0, 255, 255)     # Yellow
         else:
             color = (0, 0, 255)       # Red
     cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
@@ -28,6 +35,77 @@ def draw_detections(frame, detections):
         x1, y1, x2, y2 = detection['bbox']
         cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
 
+def draw_boxes(frame, boxes):
+    """Same as draw_detections for an (N, 4) xyxy box array."""
+    for x1, y1, x2, y2 in boxes.tolist():
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 255, 0), 2)
+
+def render_frame(frame, scale_factor):
+    """Display-only upscale of a native frame; detection never sees the scaled copy."""
+    if scale_factor == 1:
+        return frame.copy()
+    return cv2.resize(frame, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_LINEAR)
+
+def draw_signals(frame, intersections_config, scale_factor, traffic_data, output_signals):
+    decisions = {(item["intersection"], item["road"]): item for item in output_signals}
+    for inter_no, inter_data in intersections_config.items():
+        for road_no, roi in inter_data.get("roads", {}).items():
+            x, y, w, h = [int(coord * scale_factor) for coord in roi]
+            decision = decisions.get((inter_no, road_no))
+            signal = decision["signal"] if decision else "UNKNOWN"
+            dynamic_duration = decision.get("dynamic_green_duration") if decision else None
+            counts = traffic_data.get(inter_no, {}).get(road_no, {"car": 0, "ambulance": 0, "schoolbus": 0, "accident": 0})
+            mode = decision.get("mode", "Normal") if decision else "Normal"
+            draw_roi(frame, (x, y, w, h), inter_no, road_no, counts, signal, dynamic_duration, mode)
+
+class PreviewWriter:
+    """
+    Renders a low-rate annotated preview on a background thread for headless runs.
+    The main loop only hands over references to the latest native frame; scaling, drawing
+    and JPEG encoding happen at most once every `interval` seconds, off the hot path.
+    """
+    def __init__(self, intersections_config, scale_factor, path="preview.jpg", interval=1.0):
+        self.intersections_config = intersections_config
+        self.scale_factor = scale_factor
+        self.path = path
+        self.interval = interval
+        self.latest = None
+        self.last_submit = 0.0
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="preview-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, traffic_data, output_signals):
+        now = time.monotonic()
+        if now - self.last_submit < self.interval:
+            return
+        self.last_submit = now
+        with self.condition:
+            self.latest = (frame, traffic_data, output_signals)
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.latest is not None or not self.running)
+                if not self.running:
+                    return
+                frame, traffic_data, output_signals = self.latest
+                self.latest = None
+            preview = render_frame(frame, self.scale_factor)
+            draw_signals(preview, self.intersections_config, self.scale_factor, traffic_data, output_signals)
+            # Write then rename so readers never see a half-written image.
+            tmp_path = self.path + ".tmp.jpg"
+            if cv2.imwrite(tmp_path, preview):
+                os.replace(tmp_path, self.path)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=1.0)
+
 def log_congestion(traffic_data, current_time):
     log_entry = {
         "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S"),
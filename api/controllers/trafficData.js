@@ -9,15 +9,20 @@ function transformData(data) {
             count++;
             result[intersection] = {
                 location,
+                green: 'none',
+                yellow: 'none',
                 vehicles: {}
             };
         }
 
-        if (!result[intersection].green && signal) {
-            if (road === "north" || road === "south") {
-                result[intersection].green = (signal === "GREEN")?'n-s':'e-w';
-            } else if (road === "east" || road === "west") {
-                result[intersection].green = (signal === "GREEN")?'e-w':'n-s';
+        // A red road says nothing about the cross street: during all-red every road is red.
+        if (signal) {
+            const axis = (road === "north" || road === "south")?'n-s':'e-w';
+            const light = signal.toUpperCase();
+            if (light === "GREEN") {
+                result[intersection].green = axis;
+            } else if (light === "YELLOW") {
+                result[intersection].yellow = axis;
             }
         }
         
@@ -63,6 +63,11 @@ const TrafficSignalData = () => {
                 <p>
                   <strong>Green Light:</strong> {intersection.green.toUpperCase()}
                 </p>
+                {intersection.yellow && intersection.yellow !== "none" && (
+                  <p>
+                    <strong>Yellow Light:</strong> {intersection.yellow.toUpperCase()}
+                  </p>
+                )}
                 <h3 className={styles.sectionTitle}>Vehicles</h3>
                 <ul className={styles.vehicleList}>
                   {Object.entries(intersection.vehicles).map(([direction, stats]) => (
@@ -43,7 +43,7 @@ export default function MapGrid() {
         const intersectionNumber = index < 9 ? index - 5 : index - 7;
         const intersectionData = trafficData[intersectionNumber];
 
-        const borderColor = intersectionData?.green === "n-s" ? "red" : "blue";
+        const borderColor = intersectionData?.green === "n-s" ? "red" : intersectionData?.green === "e-w" ? "blue" : "gray";
 
         return (
           <div key={index} className={styles.gridItem}>